@@ -1,5 +1,9 @@
 import weakref
 
+from logger import get_logger
+
+log = get_logger(__name__)
+
 class Action:
     def __init__(self, fn, parent, once = False):
         self._fn = fn
@@ -11,7 +15,7 @@ class Action:
         r = self._fn(*args)
         self._count += 1
         if self.once:
-            print("Need to remove once only action")
+            log.debug("Need to remove once only action")
         return r
 
 class ActionContainer:
@@ -49,15 +53,23 @@ class ActionContainer:
     def clean(self):
         if not self._blocked:
             if self._queued:
-                print(f"{len(self._queued)} queued items")
-                for q in self._queued:
+                # Take the queue first so its items run once only
+                queued, self._queued = self._queued, []
+                log.debug("%d queued items", len(queued))
+                for q in queued:
                     if type(q) == weakref.ref:
                         wact = q
                         q = wact()
                     if q is not None:
                         q()
-                if not self._queued:
-                    print("Queue cleared")
+
+    def prune(self):
+        """
+        Drop the weakly held actions that no longer exist, returns whether any are left (or queued)
+        """
+        if not self._blocked:
+            self._actions = [a for a in self._actions if type(a) != weakref.ref or a() is not None]
+        return bool(self._actions or self._queued)
 
     def add(self, func, weak=True, once=False):
         if self._blocked: # Avoid modifiying the list while it's being iterated
@@ -77,4 +89,4 @@ class ActionContainer:
         return act
 
     def remove(self, func):
-        print("Need to implement remove action from container")
\ No newline at end of file
+        log.warning("Need to implement remove action from container")
\ No newline at end of file
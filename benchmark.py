@@ -0,0 +1,310 @@
+"""
+Benchmarks
+- Physics steps per gravity engine and integrator, sprite updates and drawing, indicator
+  arrows, GUI controls and input dispatch
+- Runs without a display (SDL's dummy video driver) and writes the results to a JSON file,
+  so runs on the same hardware can be compared across versions
+
+Usage:
+    python benchmark.py --out benchmark.json
+    python benchmark.py --quick --only physics,inputs
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import platform
+import sys
+import time
+import numpy as np
+import pygame
+
+import logger
+from body_table import BodyTable
+from constants import DELTA_T, PLANET_DEFAULT_DENSITY, SCREEN_WIDTH, SCREEN_HEIGHT
+from simulation import Simulation
+from surface_cache import body_surfaces
+from text_cache import text_surfaces
+
+PHYSICS_SIZES = (10, 100, 1000, 10000, 100000)
+SPRITE_SIZES = (10, 100, 1000, 5000)
+EVENT_SIZES = (0, 100, 1000, 10000)
+QUICK_PHYSICS_SIZES = (10, 100, 1000)
+QUICK_SPRITE_SIZES = (10, 100)
+QUICK_EVENT_SIZES = (0, 100)
+
+# Direct summation is O(N^2), larger sizes are skipped for it
+DIRECT_MAX = 20000
+
+GROUPS = ("physics", "sprites", "arrows", "gui", "inputs")
+
+def measure(fn, min_time = 0.2, min_runs = 3, max_runs = 1000) -> dict:
+    """
+    Call fn until at least min_time seconds and min_runs calls have passed
+    - Returns mean, min and max seconds per call and the number of calls
+    """
+    times = []
+    total = 0.0
+    while (total < min_time or len(times) < min_runs) and len(times) < max_runs:
+        start = time.perf_counter()
+        fn()
+        t = time.perf_counter() - start
+        times.append(t)
+        total += t
+    times = np.array(times)
+    return {"mean_s": float(times.mean()), "min_s": float(times.min()), "max_s": float(times.max()), "runs": len(times)}
+
+def random_bodies(n, seed = 0) -> BodyTable:
+    """
+    n bodies scattered over the screen with small random velocities
+    """
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform((0, 0), (SCREEN_WIDTH, SCREEN_HEIGHT), size=(n, 2))
+    vel = rng.normal(scale=1.0, size=(n, 2))
+    radius = rng.uniform(1, 5, size=n)
+    density = np.full(n, PLANET_DEFAULT_DENSITY)
+    mass = density*(4/3*math.pi*radius**3)
+    bodies = BodyTable(n)
+    bodies.extend(pos, vel=vel, mass=mass, radius=radius, density=density, ids=np.arange(1, n+1))
+    return bodies
+
+def bench_physics(sizes, engines, integrators, min_time) -> list:
+    """
+    Time one Simulation.step() for each engine, integrator and body count
+    """
+    results = []
+    for engine in engines:
+        for integrator in integrators:
+            for n in sizes:
+                if engine == "direct" and n > DIRECT_MAX:
+                    continue
+                simulation = Simulation(random_bodies(n), engine=engine, integrator=integrator, dt=DELTA_T)
+                try:
+                    simulation.step() # warm up (first force evaluation, worker start up)
+                    r = measure(simulation.step, min_time)
+                finally:
+                    simulation.close()
+                r.update(group="physics", name="step", n=n, engine=engine, integrator=integrator)
+                r["bodies_per_s"] = n/r["mean_s"]
+                results.append(r)
+                print(f"physics {engine}/{integrator} N={n}: {r['mean_s']*1000:.3f} ms/step")
+    return results
+
+def make_app():
+    """
+    The App in its draw state, on the dummy display
+    """
+    from main import App
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = App('draw')
+        app.update(0)
+    return app
+
+def populate(scene, n, seed = 0):
+    """
+    Replace the scene's bodies with n planets (with their indicator arrows)
+    """
+    from celestial_entity import PlanetEntity
+    from glm import vec3
+
+    rng = np.random.default_rng(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        scene.kill_all_objects()
+        for x, y, r, vx, vy in zip(rng.uniform(0, SCREEN_WIDTH, n), rng.uniform(0, SCREEN_HEIGHT, n),
+                                   rng.integers(10, 30, n), rng.normal(size=n), rng.normal(size=n)):
+            p = PlanetEntity((int(x), int(y)), radius=int(r))
+            p.velocity = vec3(vx, vy, 0)
+            scene.add_new_celestial(p)
+        # Pin a snapshot of the new bodies without stepping the physics
+        scene.update(0)
+
+def quiet(fn):
+    """
+    fn with anything it writes to stdout discarded
+    """
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+    return run
+
+def bench_sprites(app, sizes, min_time) -> list:
+    """
+    Time the scene update (without physics steps) and drawing with n planet sprites
+    """
+    scene = app.state.scene
+    screen = app.screen
+    results = []
+    for n in sizes:
+        populate(scene, n)
+        for name, fn in (("scene_update", lambda: scene.update(0)),
+                         ("sprite_update", lambda: scene.celest_objs.update(0)),
+                         ("scene_draw", lambda: scene.draw(screen)),
+                         ("sprite_draw", lambda: scene.content.draw(screen))):
+            r = measure(quiet(fn), min_time)
+            r.update(group="sprites", name=name, n=n)
+            results.append(r)
+            print(f"sprites {name} N={n}: {r['mean_s']*1000:.3f} ms")
+    return results
+
+def bench_arrows(app, sizes, min_time) -> list:
+    """
+    Time updating and drawing the indicator arrows of n bodies (two arrows each)
+    """
+    scene = app.state.scene
+    screen = app.screen
+    layer = scene.arrows
+    results = []
+    for n in sizes:
+        populate(scene, n)
+        snapshot = scene.simulation.snapshots.acquire()
+        camera = scene.camera
+
+        def update():
+            layer.update(camera.transform(snapshot.pos[:n]), camera.directions(snapshot.vel[:n]), camera.directions(snapshot.acc[:n]))
+
+        def draw():
+            layer.draw(screen)
+
+        for name, fn in (("arrow_update", update), ("arrow_draw", draw)):
+            r = measure(quiet(fn), min_time)
+            r.update(group="arrows", name=name, n=n, arrows=2*n)
+            results.append(r)
+            print(f"arrows {name} N={n}: {r['mean_s']*1000:.3f} ms")
+    return results
+
+def bench_gui(app, min_time) -> list:
+    """
+    Time updating and drawing the scene's GUI controls
+    """
+    scene = app.state.scene
+    screen = app.screen
+    results = []
+    for name, fn in (("controls_update", lambda: scene.controls.update(0)),
+                     ("controls_draw", lambda: scene.controls.draw(screen))):
+        r = measure(quiet(fn), min_time)
+        r.update(group="gui", name=name, n=len(scene.controls))
+        results.append(r)
+        print(f"gui {name}: {r['mean_s']*1000:.3f} ms")
+    return results
+
+def event_flood(n, seed = 0) -> list:
+    """
+    n input events for the draw state's bindings, repeating every 8 events:
+    - Mouse motion (bound to "update", which has no actions outside of placing a new body)
+    - Left/right arrow presses and releases (camera moves), alternating so any moves cancel out
+    - Mouse button 1 releases, bound to "new_object" but only acted on once a press started one
+      (presses would create bodies and pause the scene, so they are left out)
+    - Presses and releases of keys with no binding
+    """
+    rng = np.random.default_rng(seed)
+    events = []
+    for i in range(n):
+        step = i % 8
+        camera_key = pygame.K_LEFT if i % 16 < 8 else pygame.K_RIGHT
+        if step in (0, 4):
+            events.append(pygame.event.Event(pygame.MOUSEMOTION, pos=(int(rng.integers(SCREEN_WIDTH)), int(rng.integers(SCREEN_HEIGHT))), rel=(1, 1), buttons=(0, 0, 0)))
+        elif step in (1, 5):
+            events.append(pygame.event.Event(pygame.KEYDOWN if step == 1 else pygame.KEYUP, key=camera_key, mod=0, unicode="", scancode=0))
+        elif step == 3:
+            events.append(pygame.event.Event(pygame.MOUSEBUTTONUP, pos=(int(rng.integers(SCREEN_WIDTH)), int(rng.integers(SCREEN_HEIGHT))), button=1))
+        else:
+            key = pygame.K_z if step == 2 else pygame.K_x
+            events.append(pygame.event.Event(pygame.KEYDOWN if i % 16 < 8 else pygame.KEYUP, key=key, mod=0, unicode="", scancode=0))
+    return events
+
+def bench_inputs(app, sizes, min_time) -> list:
+    """
+    Time the input pipeline (handle_events() then update()) of the draw state per frame of n events
+    """
+    inputs = app.inputs
+    results = []
+    for n in sizes:
+        events = event_flood(n)
+
+        def frame():
+            inputs.handle_events(events)
+            inputs.update(16)
+
+        r = measure(quiet(frame), min_time)
+        r.update(group="inputs", name="dispatch", n=n, bindings=len(inputs.inputs))
+        results.append(r)
+        print(f"inputs dispatch events={n}: {r['mean_s']*1000:.3f} ms")
+    return results
+
+def environment() -> dict:
+    return {
+        "time" : time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python" : platform.python_version(),
+        "numpy" : np.__version__,
+        "pygame" : pygame.version.ver,
+        "platform" : platform.platform(),
+        "machine" : platform.machine(),
+        "processor" : platform.processor(),
+        "cpus" : os.cpu_count()
+    }
+
+def run(out = None, groups = GROUPS, quick = False, engines = None, integrators = None, min_time = 0.2) -> dict:
+    """
+    Run the chosen benchmark groups, returns (and optionally writes) the report
+    """
+    from gravity import ENGINES
+
+    engines = engines or [e for e in ENGINES if e != "parallel"]
+    integrators = integrators or ["euler"]
+    results = []
+
+    if "physics" in groups:
+        results += bench_physics(QUICK_PHYSICS_SIZES if quick else PHYSICS_SIZES, engines, integrators, min_time)
+
+    if set(groups) & {"sprites", "arrows", "gui", "inputs"}:
+        # Keep the scene's INFO messages (eg. from kill_all_objects()) out of the report
+        logger.set_levels("WARNING", "WARNING")
+        app = make_app()
+        try:
+            if "sprites" in groups:
+                results += bench_sprites(app, QUICK_SPRITE_SIZES if quick else SPRITE_SIZES, min_time)
+            if "arrows" in groups:
+                results += bench_arrows(app, QUICK_SPRITE_SIZES if quick else SPRITE_SIZES, min_time)
+            if "gui" in groups:
+                results += bench_gui(app, min_time)
+            if "inputs" in groups:
+                results += bench_inputs(app, QUICK_EVENT_SIZES if quick else EVENT_SIZES, min_time)
+        finally:
+            app.state.exit()
+            pygame.quit()
+
+    report = {"environment": environment(), "results": results, "surface_cache": body_surfaces.stats(), "text_cache": text_surfaces.stats()}
+    if out:
+        with open(out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {len(results)} results to {out}")
+    return report
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Benchmark physics, rendering and input handling")
+    parser.add_argument("--out", default="benchmark.json", help="JSON file to write the results to")
+    parser.add_argument("--only", help=f"comma separated groups to run (from {','.join(GROUPS)})")
+    parser.add_argument("--engines", help="comma separated gravity engines (default: all but parallel)")
+    parser.add_argument("--integrators", help="comma separated integrators (default: euler)")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes only")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds to spend on each measurement")
+    args = parser.parse_args(argv)
+
+    groups = args.only.split(",") if args.only else GROUPS
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown groups: {', '.join(sorted(unknown))}")
+
+    run(args.out, groups, args.quick,
+        args.engines.split(",") if args.engines else None,
+        args.integrators.split(",") if args.integrators else None,
+        args.min_time)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,210 @@
+import threading
+import numpy as np
+
+class BodyTable():
+    """
+    Structure-of-arrays store for celestial bodies
+    - One row per body: position, velocity, acceleration, mass, radius, density, id
+    - Rows are kept contiguous in [0, count), removal swaps the last row into the hole
+    - Each row can have an owner (eg. a CelestialEntity) which is told when its row moves
+    - 'lock' must be held to add/remove rows while another thread may be stepping the table
+    """
+    INITIAL_CAPACITY = 64
+
+    def __init__(self, capacity = INITIAL_CAPACITY):
+        self.__count = 0
+        self.__capacity = 0
+
+        # Bumped whenever rows are added, removed or moved
+        self.version = 0
+
+        self.lock = threading.RLock()
+
+        self._pos = np.zeros((0, 3))
+        self._vel = np.zeros((0, 3))
+        self._acc = np.zeros((0, 3))
+        self._mass = np.zeros(0)
+        self._radius = np.zeros(0)
+        self._density = np.zeros(0)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._owners = []
+
+        self.reserve(capacity)
+
+    ###
+    ### Column views (only the live rows)
+    ###
+
+    @property
+    def pos(self):
+        return self._pos[:self.__count]
+
+    @property
+    def vel(self):
+        return self._vel[:self.__count]
+
+    @property
+    def acc(self):
+        return self._acc[:self.__count]
+
+    @property
+    def mass(self):
+        return self._mass[:self.__count]
+
+    @property
+    def radius(self):
+        return self._radius[:self.__count]
+
+    @property
+    def density(self):
+        return self._density[:self.__count]
+
+    @property
+    def ids(self):
+        return self._ids[:self.__count]
+
+    @property
+    def owners(self):
+        return self._owners
+
+    @property
+    def capacity(self):
+        return self.__capacity
+
+    def __len__(self):
+        return self.__count
+
+    ###
+    ### Public functions
+    ###
+
+    def reserve(self, capacity):
+        """
+        Grow the backing arrays so at least 'capacity' rows fit
+        """
+        if capacity <= self.__capacity:
+            return
+
+        new_capacity = max(capacity, self.__capacity*2, 1)
+        n = self.__count
+        for name in ("_pos", "_vel", "_acc"):
+            old = getattr(self, name)
+            new = np.zeros((new_capacity, 3))
+            new[:n] = old[:n]
+            setattr(self, name, new)
+        for name, dtype in (("_mass", np.float64), ("_radius", np.float64), ("_density", np.float64), ("_ids", np.int64)):
+            old = getattr(self, name)
+            new = np.zeros(new_capacity, dtype=dtype)
+            new[:n] = old[:n]
+            setattr(self, name, new)
+
+        self.__capacity = new_capacity
+        self.version += 1
+
+    def add(self, owner = None, pos = (0, 0, 0), vel = (0, 0, 0), acc = (0, 0, 0), mass = 0.0, radius = 0.0, density = 0.0, id = 0) -> int:
+        """
+        Append a body and return its row index
+        """
+        row = self.__count
+        self.reserve(row+1)
+
+        self._pos[row] = pos
+        self._vel[row] = vel
+        self._acc[row] = acc
+        self._mass[row] = mass
+        self._radius[row] = radius
+        self._density[row] = density
+        self._ids[row] = id
+        self._owners.append(owner)
+        if owner is not None:
+            owner._table = self
+            owner._row = row
+
+        self.__count += 1
+        self.version += 1
+
+        return row
+
+    def extend(self, pos, vel = None, mass = None, radius = None, density = None, ids = None, acc = None):
+        """
+        Append many ownerless bodies at once from array-likes
+        - Returns the slice of the new rows
+        """
+        pos = np.asarray(pos, dtype=np.float64)
+        n = len(pos)
+        start = self.__count
+        stop = start + n
+        self.reserve(stop)
+
+        self._pos[start:stop] = 0
+        self._pos[start:stop, :pos.shape[1]] = pos
+        for name, values in (("_vel", vel), ("_acc", acc)):
+            col = getattr(self, name)
+            col[start:stop] = 0
+            if values is not None:
+                values = np.asarray(values, dtype=np.float64)
+                col[start:stop, :values.shape[1]] = values
+        for name, values in (("_mass", mass), ("_radius", radius), ("_density", density), ("_ids", ids)):
+            col = getattr(self, name)
+            col[start:stop] = 0 if values is None else values
+
+        self._owners.extend([None]*n)
+
+        self.__count = stop
+        self.version += 1
+
+        return slice(start, stop)
+
+    def remove(self, row):
+        """
+        Remove a row by moving the last row into its place
+        - The owner of the moved row is re-pointed at its new row
+        - Returns the owner of the removed row
+        """
+        last = self.__count - 1
+        if row < 0 or row > last:
+            raise IndexError(f"Row {row} out of range for {self.__count} bodies")
+
+        owner = self._owners[row]
+        if row != last:
+            self._pos[row] = self._pos[last]
+            self._vel[row] = self._vel[last]
+            self._acc[row] = self._acc[last]
+            self._mass[row] = self._mass[last]
+            self._radius[row] = self._radius[last]
+            self._density[row] = self._density[last]
+            self._ids[row] = self._ids[last]
+            moved = self._owners[last]
+            self._owners[row] = moved
+            if moved is not None:
+                moved._row = row
+        self._owners.pop()
+
+        self.__count = last
+        self.version += 1
+
+        return owner
+
+    def remove_rows(self, rows):
+        """
+        Remove several rows, returns their owners
+        """
+        # Highest first so swapped-in rows are never ones still waiting to be removed
+        return [self.remove(r) for r in sorted(set(int(r) for r in rows), reverse=True)]
+
+    def move_row(self, row, dest) -> int:
+        """
+        Move a row (and its owner) into another table, returns the new row index
+        """
+        new_row = dest.add(self._owners[row], self._pos[row], self._vel[row], self._acc[row],
+                           self._mass[row], self._radius[row], self._density[row], self._ids[row])
+        self.remove(row)
+        return new_row
+
+    def clear(self):
+        """
+        Remove all rows (owners are not notified)
+        """
+        self.__count = 0
+        self._owners.clear()
+        self.version += 1
@@ -1,56 +1,107 @@
 import pygame
-import glm
-from glm import vec2, vec3, vec4, mat4
+from glm import vec3
 import math
-from constants import PLANET_DEFAULT_DENSITY, PLANET_MIN_RADIUS, PLANET_MAX_RADIUS, PLANET_COLOR, ARROW_TO_VEL_RATIO, DELTA_T
+from body_table import BodyTable
+from logger import get_logger
+from surface_cache import body_surfaces
+from constants import PLANET_DEFAULT_DENSITY, PLANET_MIN_RADIUS, PLANET_MAX_RADIUS, PLANET_COLOR, ARROW_TO_VEL_RATIO
+
+log = get_logger(__name__)
 
 class CelestialEntity(pygame.sprite.Sprite):
     """
     Base class for celestial objects 
     - Entity appearance (sprite)
-    - Radius, Mass, Force, Acceleration, Velocity, Position
+    - Radius, Mass, Acceleration, Velocity, Position (a row in a BodyTable)
     - 
     """
     def __init__(self, center, **kwargs):
         super().__init__()
 
-        self.__id = '0'
-
-        self.neighbours = pygame.sprite.Group()
+        # Each entity is a handle onto one row of a BodyTable. Until it is added to a
+        # CelestialSpriteGroup it owns a private single row table.
+        self._table = None
+        self._row = -1
+        BodyTable(1).add(self, pos=(center[0], center[1], 0))
 
         self.density = kwargs.pop("density", 0.005)
         
-        self.__radius = self._correct_radius(kwargs.pop("radius", 0))
-        self.mass = self.density*(4/3*math.pi*(self.__radius**3)) 
-        
-        self.F = vec3(0)
-        self.acc = vec3(0)
-        self.vel = vec3(0)
-        self.pos = vec3(center[0], center[1], 0)
+        radius = self._correct_radius(kwargs.pop("radius", 0))
+        self._table._radius[self._row] = radius
+        self.mass = self.density*(4/3*math.pi*(radius**3)) 
 
-        self.world_offset = vec3(0)
-        self.world_rotation = vec3(0)
-
-        self.force_just_calcd = False  
+        # Zoom factor the image is drawn at (see place())
+        self._zoom = 1.0
 
     ###
     ### Properties
     ###
 
+    @property
+    def table(self):
+        """
+        BodyTable holding this entity's row
+        """
+        return self._table
+
+    @property
+    def row(self):
+        return self._row
+
     @property
     def id(self):
-        return self.__id
+        return int(self._table._ids[self._row])
 
     @id.setter
     def id(self, id):
-        self.__id = id
+        self._table._ids[self._row] = id
+
+    @property
+    def pos(self):
+        return vec3(*self._table._pos[self._row])
+
+    @pos.setter
+    def pos(self, p):
+        self._table._pos[self._row] = (p[0], p[1], p[2])
+
+    @property
+    def vel(self):
+        return vec3(*self._table._vel[self._row])
+
+    @vel.setter
+    def vel(self, v):
+        self._table._vel[self._row] = (v[0], v[1], v[2])
+
+    @property
+    def acc(self):
+        return vec3(*self._table._acc[self._row])
+
+    @acc.setter
+    def acc(self, a):
+        self._table._acc[self._row] = (a[0], a[1], a[2])
+
+    @property
+    def mass(self):
+        return float(self._table._mass[self._row])
+
+    @mass.setter
+    def mass(self, m):
+        self._table._mass[self._row] = m
+
+    @property
+    def density(self):
+        return float(self._table._density[self._row])
+
+    @density.setter
+    def density(self, d):
+        self._table._density[self._row] = d
 
     @property
     def radius(self):
         """
         Getter for radius
         """
-        return self.__radius
+        return float(self._table._radius[self._row])
 
     @radius.setter
     def radius(self, r):
@@ -59,16 +110,17 @@ class CelestialEntity(pygame.sprite.Sprite):
         - Resets image, rect, mass and radius
         """
         r = self._correct_radius(r)
-        size = 2*r+2        
-        surf = pygame.Surface([size]*2, pygame.SRCALPHA)
-        pygame.draw.circle(surf, PLANET_COLOR, [r]*2, r)
-        self.image = surf.convert_alpha()
-        self.rect = self.image.get_rect(center=self.rect.center)            
+        self._table._radius[self._row] = r
+        self.redraw()
         self.mass = self.density*r**3
-        self.__radius = r
 
-        # Store original image copy to prevent scale transform artifacts
-        self.__zero_image = self.image.convert_alpha()
+    def redraw(self):
+        """
+        Re-render the image and rect from the current radius (eg. after a merge grew the body)
+        """
+        # Shared with every body of the same size (see surface_cache.py)
+        self.image = body_surfaces.circle(self.radius, PLANET_COLOR, self._zoom)
+        self.rect = self.image.get_rect(center=self.rect.center)            
 
     @property
     def acceleration(self):
@@ -88,13 +140,9 @@ class CelestialEntity(pygame.sprite.Sprite):
         - Takes the length of an arrow and sets the velocity proportional to it.
         """
         if use_actual_value:
-            self.vel.x = vel.x
-            self.vel.y = vel.y
-            self.vel.z = 0
+            self.vel = (vel.x, vel.y, 0)
         else:
-            self.vel.x = vel.x * ARROW_TO_VEL_RATIO
-            self.vel.y = vel.y * ARROW_TO_VEL_RATIO
-            self.vel.z = 0
+            self.vel = (vel.x * ARROW_TO_VEL_RATIO, vel.y * ARROW_TO_VEL_RATIO, 0)
 
     @property
     def position(self):
@@ -103,79 +151,26 @@ class CelestialEntity(pygame.sprite.Sprite):
     @position.setter
     def position(self, pos):
         if isinstance(pos, tuple):
-            self.pos = vec3(pos[0], pos[1], 0)
+            self.pos = (pos[0], pos[1], 0)
             self.rect.center = pos
         elif isinstance(pos, vec3):
             self.pos = pos
             self.rect.center = (pos.x, pos.y)
 
     def update(self, dt):
-        # Euler function - Updates self.pos, self.acc, and self.vel
-        self.__integration_euler()
-
-
-        # rotatin self.pos vec3 around in 3d
-
-        p = self.pos
-        x = vec3(1, 0, 0)
-        y = vec3(0, 1, 0)
-        z = vec3(0, 0, 1)
-        xrot = glm.radians(self.world_rotation.x)
-        yrot = glm.radians(self.world_rotation.y)
-        zrot = glm.radians(self.world_rotation.z)
-        p = vec4(p.x, p.y, p.z, 0)
-        # p = p*scale
-        M = glm.rotate(mat4(1), xrot, x)
-        M = glm.rotate(M, yrot, y)
-        M = glm.rotate(M, zrot, z)
-        p = M*p
-        p = vec3(p.x, p.y, p.z)
-        print(f"Cam pos: {self.world_offset}, Cam rot: {self.world_rotation} Current vector center point of body: {p}")
-
-        center_in_world = (p.x, p.y)
-        self.rect.center = center_in_world   
-
-        # # Update rect position from actual position
-        # self.rect.center = (int(self.pos.x), int(self.pos.y))
-
-        # # # Update image + rect (but not radius?) for zoom
-        # # zoom_factor = 1
-        # # if self.world_offset.z == 0:
-        # #     self.image = self.__zero_image.convert_alpha()
-        # #     self.rect = self.image.get_rect(center = (self.rect.center))
-        # # else:
-        # #     # Calc new drawing diameter
-        # #     zoom_factor = (self.world_offset.z+100)/100
-        # #     draw_diam = int(self.__radius*2*zoom_factor)
-            
-        # #     # Check if we need to scale
-        # #     if draw_diam != self.rect.width:
-        # #         # Check if we even need to show the body anymore
-        # #         if draw_diam > 0:
-        # #             new_size = [draw_diam]*2
-        # #             print(f"Zoom factor: {zoom_factor} Drawing to new size {new_size} from {self.rect.width},{self.rect.height}")
-        # #             self.image = pygame.transform.scale(self.__zero_image, new_size)
-        # #         else:
-        # #             surf = pygame.Surface((1,1)).convert_alpha()
-        # #             surf.fill(PLANET_COLOR)
-        # #             self.image = surf
-
-        # #         self.rect = self.image.get_rect(center = (self.rect.center))
-
-        # # # Update rect position based on world offset
-        # # wx = zoom_factor*(self.rect.center[0] + int(self.world_offset.x))
-        # # wy = zoom_factor*(self.rect.center[1] + int(self.world_offset.y))
-        # # center_in_world = (wx, wy)
-        # # self.rect.center = center_in_world
-
-        # # Update rect position based on world offset
-        # wx = self.rect.center[0]) + int(self.world_offset.x)
-        # wy = self.rect.center[1]) + int(self.world_offset.y)
-        # center_in_world = (wx, wy)
-        # self.rect.center = center_in_world       
-
-        self.rect.x += int(self.world_offset.x)
-        self.rect.y += int(self.world_offset.y)
+        # Physics is stepped for all bodies at once by the scene's Simulation, and the sprite
+        # is moved on screen by the scene's camera (see place())
+        pass
+
+    def place(self, center, zoom = 1.0):
+        """
+        Move the sprite to a screen position, computed for all bodies at once by the scene's camera
+        - The image is swapped for the shared one of the new zoom when it changed
+        """
+        if zoom != self._zoom:
+            self._zoom = zoom
+            self.redraw()
+        self.rect.center = center
 
     def _correct_radius(self, radius):
         """
@@ -186,59 +181,15 @@ class CelestialEntity(pygame.sprite.Sprite):
             radius = 1
         return radius
 
-    def __integration_euler(self):
-        '''
-        Calculates the new position and velocity using Euler integration method.
-        
-        The force is also added to the other object so it doesn't have to be 
-        calculated twice.
-        '''
-        for obj in self.neighbours:
-            if obj != self:
-                f = self.__get_force(obj)
-                self.F.x += f.x
-                self.F.y += f.y
-                if not self.force_just_calcd:                
-                    obj.F.x -= f.x
-                    obj.F.y -= f.y
-                    obj.force_just_calcd = True
-        self.force_just_calcd = True
-            
-        self.acc.x = self.F.x / self.mass
-        self.acc.y = self.F.y / self.mass
-        
-        self.pos.x += self.vel.x * DELTA_T + 0.5 * self.acc.x * DELTA_T
-        self.pos.y += self.vel.y * DELTA_T + 0.5 * self.acc.y * DELTA_T
-        
-        self.vel.x += self.acc.x * DELTA_T
-        self.vel.y += self.acc.y * DELTA_T
-        
-        self.F = vec3(0) #resets force for the next iteration
-        
-    def __get_force(self, obj) -> vec3:
-        '''
-        Return the force between self and obj.
-        '''
-        vect = vec3(obj.pos.x - self.pos.x, obj.pos.y - self.pos.y, 0)
-        dist = glm.distance(self.pos, obj.pos)
-        factor = self.mass * obj.mass / dist**3 #Power of 3 because the directional vector is not normalized
-        return vec3(vect.x*factor, vect.y*factor, 0)
-
 class PlanetEntity(CelestialEntity):
     def __init__(self, center, **kwargs):
         super().__init__(center, **kwargs)   
  
         self.density = PLANET_DEFAULT_DENSITY
 
-        size = 2*self.radius+2
-        surf = pygame.Surface([size]*2, pygame.SRCALPHA)
-        pygame.draw.circle(surf, PLANET_COLOR, [self.radius]*2, self.radius)
-        self.image = surf.convert_alpha()
+        self.image = body_surfaces.circle(self.radius, PLANET_COLOR, self._zoom)
         self.rect = self.image.get_rect(center=center)
 
-        # Store the original image copy to prevent scale transform artifacts
-        self.__zero_image = self.image.convert_alpha()
-
 
     ###
     ### Public functions
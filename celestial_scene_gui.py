@@ -1,5 +1,11 @@
+import os
 import pygame
 from usercontrol import UserControlGroup, Button, ToggleButton
+from logger import get_logger
+
+log = get_logger(__name__)
+
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "images")
 
 class CelestialSceneGui():
     PLAY_PAUSE_BUTTON = "playpause"
@@ -9,7 +15,7 @@ class CelestialSceneGui():
     BUTTON_FG_COLOR = (255, 255, 255)
 
     def __init__(self, controls_group = None, **kwargs):
-        print(f"Controls group: {controls_group}")
+        log.debug("Controls group: %s", controls_group)
 
         if controls_group == None:
             self.controls_group = UserControlGroup()
@@ -30,15 +36,15 @@ class CelestialSceneGui():
         return self.__scene_control_buttons
 
     def __build_play_pause_button(self, pos):
-        play_btn_img = pygame.image.load("resources\images\play_button.png")
-        pause_btn_img = pygame.image.load("resources\images\pause_button.png")
+        play_btn_img = pygame.image.load(os.path.join(IMAGES_DIR, "play_button.png"))
+        pause_btn_img = pygame.image.load(os.path.join(IMAGES_DIR, "pause_button.png"))
 
-        fn1 = lambda: print("Function 1")
-        fn2 = lambda: print("Function 2")
+        fn1 = lambda: log.debug("Function 1")
+        fn2 = lambda: log.debug("Function 2")
         btn = ToggleButton(self.controls_group, self.PLAY_PAUSE_BUTTON, function1 = fn1, function2 = fn2, width = 50, height = 50)
         btn.x = pos[0]
         btn.y = pos[1]
-        print(f"Created ToggleButton @ {btn.x} {btn.y}")
+        log.debug("Created ToggleButton @ %d %d", btn.x, btn.y)
         self.__scene_control_buttons[self.PLAY_PAUSE_BUTTON] = btn
 
     # def __draw_play_button(self, surface):
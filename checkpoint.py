@@ -0,0 +1,105 @@
+"""
+Scene checkpoints
+- The body table is written as one .npy file of fixed-size records, so it can be memory-mapped
+- A small JSON header next to it (<name>.json) holds the simulation time, settings and any extra
+  values the caller wants to keep (eg. the camera)
+"""
+import json
+import os
+import numpy as np
+
+from body_table import BodyTable
+
+CHECKPOINT_VERSION = 1
+
+CHECKPOINT_DTYPE = np.dtype([
+    ("pos", np.float64, 3),
+    ("vel", np.float64, 3),
+    ("mass", np.float64),
+    ("radius", np.float64),
+    ("density", np.float64),
+    ("id", np.int64)
+])
+
+def header_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+def save_checkpoint(path, simulation, **extra) -> dict:
+    """
+    Write every body of the simulation's table, plus a header, returns the header
+    - Both files are written under temporary names and then moved into place
+    """
+    bodies = simulation.bodies
+    tmp = path + ".tmp"
+    with bodies.lock:
+        n = len(bodies)
+        records = np.lib.format.open_memmap(tmp, mode="w+", dtype=CHECKPOINT_DTYPE, shape=(n,))
+        records["pos"] = bodies.pos
+        records["vel"] = bodies.vel
+        records["mass"] = bodies.mass
+        records["radius"] = bodies.radius
+        records["density"] = bodies.density
+        records["id"] = bodies.ids
+        records.flush()
+        del records
+
+        header = {
+            "version" : CHECKPOINT_VERSION,
+            "count" : n,
+            "time" : simulation.time,
+            "steps" : simulation.steps,
+            "dt" : simulation.dt,
+            "engine" : simulation.engine.name,
+            "integrator" : simulation.integrator.name,
+            "next_id" : int(bodies.ids.max()) + 1 if n else 1
+        }
+    header.update(extra)
+
+    with open(header_path(tmp), "w") as f:
+        json.dump(header, f, indent=2)
+    os.replace(tmp, path)
+    os.replace(header_path(tmp), header_path(path))
+
+    return header
+
+def load_checkpoint(path):
+    """
+    Memory-map a checkpoint, returns (records, header)
+    - The header is empty if the .json file is missing
+    """
+    records = np.load(path, mmap_mode="r")
+    if records.dtype != CHECKPOINT_DTYPE:
+        raise ValueError(f"'{path}' is not a checkpoint (record type {records.dtype})")
+
+    header = {}
+    if os.path.exists(header_path(path)):
+        with open(header_path(path)) as f:
+            header = json.load(f)
+        if header.get("version", CHECKPOINT_VERSION) > CHECKPOINT_VERSION:
+            raise ValueError(f"Checkpoint '{path}' is from a newer version ({header['version']})")
+
+    return records, header
+
+def restore_bodies(records, bodies : BodyTable = None) -> BodyTable:
+    """
+    Append checkpoint records to a table in one bulk copy, as ownerless rows
+    """
+    if bodies is None:
+        bodies = BodyTable()
+    with bodies.lock:
+        bodies.reserve(len(bodies) + len(records))
+        bodies.extend(records["pos"], vel=records["vel"], mass=records["mass"],
+                      radius=records["radius"], density=records["density"], ids=records["id"])
+    return bodies
+
+def restore_checkpoint(path, simulation) -> dict:
+    """
+    Replace the bodies of a simulation with a checkpoint's, returns the header
+    """
+    records, header = load_checkpoint(path)
+    with simulation.bodies.lock:
+        simulation.bodies.clear()
+        restore_bodies(records, simulation.bodies)
+        simulation.time = header.get("time", 0.0)
+        simulation.steps = header.get("steps", 0)
+    return header
@@ -0,0 +1,149 @@
+import numpy as np
+
+from body_table import BodyTable
+from constants import COLLISION_CELL_SCALE
+from gravity import _ranges
+
+class SpatialHash():
+    """
+    Uniform grid broadphase for circles
+    - The cell size is keyed on the bodies' radii (cell_scale times the median diameter)
+    - Each body is entered in every cell its bounding box touches, bodies sharing a cell are
+      candidate pairs, so the cost stays near O(N) for bodies of similar size
+    """
+    def __init__(self, cell_scale = COLLISION_CELL_SCALE):
+        self.cell_scale = cell_scale
+
+    def candidate_pairs(self, pos, radius):
+        """
+        Unique (i, j) index arrays, i < j, of bodies sharing at least one cell
+        """
+        n = len(pos)
+        none = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        if n < 2:
+            return none
+
+        cell = 2*self.cell_scale*np.median(radius)
+        if not cell > 0:
+            cell = max(2*radius.max(), 1.0)
+
+        lo = np.floor((pos[:, :2] - radius[:, None])/cell).astype(np.int64)
+        hi = np.floor((pos[:, :2] + radius[:, None])/cell).astype(np.int64)
+        span = hi - lo + 1
+
+        # One entry per (body, covered cell)
+        cover, body = _ranges(np.zeros(n, dtype=np.int64), span[:, 0]*span[:, 1])
+        cx = lo[body, 0] + cover // span[body, 1]
+        cy = lo[body, 1] + cover % span[body, 1]
+        cx -= cx.min()
+        cy -= cy.min()
+        key = cx*(cy.max() + 1) + cy
+
+        order = np.argsort(key, kind='stable')
+        key = key[order]
+        body = body[order]
+
+        # Pair every entry with the entries after it in the same cell
+        starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+        sizes = np.diff(np.r_[starts, len(key)])
+        group_end = np.repeat(starts + sizes, sizes)
+        later = group_end - np.arange(len(key)) - 1
+        if not later.any():
+            return none
+        partner, entry = _ranges(np.arange(len(key)) + 1, later)
+        i = body[entry]
+        j = body[partner]
+
+        a = np.minimum(i, j)
+        b = np.maximum(i, j)
+        keep = a != b
+        pair = np.unique(a[keep]*n + b[keep])
+        return pair // n, pair % n
+
+class CollisionStage():
+    """
+    Merges overlapping bodies after a physics step
+    - Broadphase with a SpatialHash, then an exact circle overlap test
+    - Every connected group of overlapping bodies becomes one body: the heaviest member
+      survives with the total mass, the combined momentum (so velocity is mass weighted),
+      the centre of mass as position and the summed volume as radius
+    """
+    def __init__(self, cell_scale = COLLISION_CELL_SCALE):
+        self.broadphase = SpatialHash(cell_scale)
+
+        # Bodies absorbed into others so far
+        self.merged = 0
+
+    def find(self, pos, radius):
+        """
+        (i, j) index arrays of overlapping bodies
+        """
+        i, j = self.broadphase.candidate_pairs(pos, radius)
+        d = pos[i, :2] - pos[j, :2]
+        reach = radius[i] + radius[j]
+        hit = (d*d).sum(axis=1) < reach*reach
+        return i[hit], j[hit]
+
+    def resolve(self, bodies : BodyTable):
+        """
+        Merge colliding bodies in the table
+        - Returns a list of (survivor owner, [absorbed owners]) for the merged groups
+        - Absorbed owned rows are moved out to private tables, unowned rows are dropped
+        """
+        n = len(bodies)
+        i, j = self.find(bodies.pos, bodies.radius)
+        if len(i) == 0:
+            return []
+
+        # Connected groups: propagate the lowest index across pairs until nothing changes
+        label = np.arange(n)
+        while True:
+            low = np.minimum(label[i], label[j])
+            before = label.copy()
+            np.minimum.at(label, i, low)
+            np.minimum.at(label, j, low)
+            label = label[label]
+            if np.array_equal(label, before):
+                break
+
+        members = np.flatnonzero(np.bincount(label, minlength=n)[label] > 1)
+        group = label[members]
+        mass = bodies.mass[members]
+
+        # Heaviest body of each group survives (lowest row on ties)
+        order = np.lexsort((members, -mass, group))
+        sorted_group = group[order]
+        first = np.r_[True, sorted_group[1:] != sorted_group[:-1]]
+        survivors = members[order][first]
+        groups = sorted_group[first]
+
+        inv = np.searchsorted(groups, group)
+        total = np.bincount(inv, weights=mass)
+        momentum = np.stack([np.bincount(inv, weights=mass*bodies.vel[members, k]) for k in range(3)], axis=1)
+        centre = np.stack([np.bincount(inv, weights=mass*bodies.pos[members, k]) for k in range(3)], axis=1)
+        volume = np.bincount(inv, weights=bodies.radius[members]**3)
+        density = bodies.density[members]
+        occupied = np.bincount(inv, weights=np.divide(mass, density, out=np.zeros_like(mass), where=density > 0))
+
+        heavy = total > 0
+        bodies.vel[survivors[heavy]] = momentum[heavy]/total[heavy, None]
+        bodies.pos[survivors[heavy]] = centre[heavy]/total[heavy, None]
+        bodies.mass[survivors] = total
+        bodies.radius[survivors] = np.cbrt(volume)
+        bodies.density[survivors] = np.where(occupied > 0, total/np.where(occupied > 0, occupied, 1), bodies.density[survivors])
+
+        absorbed = np.setdiff1d(members, survivors)
+        owners = bodies.owners
+        merges = {s: (owners[s], []) for s in survivors}
+        for r in absorbed:
+            merges[survivors[inv[np.searchsorted(members, r)]]][1].append(owners[r])
+
+        # Highest rows first so a row swapped into a hole is never one still to be removed
+        for r in sorted(absorbed, reverse=True):
+            if owners[r] is not None:
+                bodies.move_row(r, BodyTable(1))
+            else:
+                bodies.remove(r)
+        self.merged += len(absorbed)
+
+        return list(merges.values())
@@ -3,13 +3,54 @@ WINDOW_TITLE = "Gravitational Simulator"
 SCREEN_WIDTH = 1920
 SCREEN_HEIGHT = 1080
 FPS_CAP = 144
+PROFILER_WINDOW = 240 #frames kept by the frame profiler (F3 shows it)
+SURFACE_CACHE_SIZE = 512 #pre-rendered body images kept (see surface_cache.py)
+SURFACE_CACHE_BYTES = 64*1024*1024 #memory the pre-rendered body images may use, larger images are not kept
+ZOOM_BUCKETS_PER_OCTAVE = 4 #zoom levels body images are rendered at per doubling of the zoom
+TEXT_CACHE_SIZE = 256 #rendered strings kept (see text_cache.py)
+GUI_GRID_CELL = 64 #pixel size of the grid cells user controls are hit-tested through
+LOD_RENDERING = True #plot bodies smaller than LOD_RADIUS straight into the screen's pixels (L toggles)
+LOD_RADIUS = 3 #screen radius in pixels below which a body is plotted instead of blitted
+DIRTY_RECTS = True #only clear and push the screen areas drawn to (see dirty_rects.py)
+DIRTY_RECTS_MAX = 512 #areas drawn in a frame above which the whole screen is pushed instead
 BACKGROUND_COLOR = (50, 50, 50)
 
+#LOGGING
+LOG_LEVEL = "INFO" #console level, DEBUG shows the per-frame/per-body messages
+LOG_RING_LEVEL = "INFO" #level kept in the in-memory ring buffer
+LOG_RING_SIZE = 5000 #messages kept in the ring buffer
+LOG_DUMP_PATH = "log_dump.txt" #file the ring buffer is written to (F12)
+
 #SIMULATOR PARAMETERS
 PLANET_DEFAULT_DENSITY = 0.005
 PLANET_MAX_DISTANCE = 3000 #distance an object can get away from the center of the screen
 
-DELTA_T = 0.1 #simulation time between frames
+DELTA_T = 0.1 #simulation time per physics step
+PHYSICS_RATE = 144 #physics steps per real second
+PHYSICS_MAX_STEPS = 10 #most physics steps run to catch up in one go, the rest is dropped
+PHYSICS_THREADED = False #run the physics on its own thread instead of in the frame loop
+
+GRAVITY_ENGINE = "direct" #name of the gravity engine in gravity.ENGINES
+INTEGRATOR = "euler" #name of the integrator in integrators.INTEGRATORS
+BLOCK_TIMESTEPS = False #give each body its own power-of-two fraction of DELTA_T
+BLOCK_TIMESTEP_MAX_LEVEL = 8 #smallest block step is DELTA_T/2**level
+BLOCK_TIMESTEP_ETA = 0.02 #block step accuracy factor, smaller gives smaller steps
+COLLISIONS = False #merge bodies that overlap after each step
+COLLISION_CELL_SCALE = 1.0 #collision grid cell size as a multiple of the median body diameter
+GRAVITY_SOFTENING = 0.0 #added to pair distances to avoid singular forces at close range
+GRAVITY_BLOCK_SIZE = 256 #bodies per tile in the direct summation kernel
+BARNES_HUT_THETA = 0.5 #opening angle, smaller is more accurate and slower
+BARNES_HUT_LEAF_SIZE = 8 #max bodies in a tree leaf before it is split
+PM_RESOLUTION = 256 #particle mesh grid cells per side
+PM_PADDING = 0.1 #empty space around the bodies in the particle mesh, as a fraction of their extent
+PARALLEL_WORKERS = 0 #worker processes for the parallel engine, 0 uses every core
+CHECKPOINT_PATH = "checkpoint.npy" #scene checkpoint file (a .json header is written next to it)
+RECORD_PATH = "recording.traj" #trajectory file written while recording
+RECORD_STRIDE = 1 #record a frame every N physics steps
+RECORD_CHUNK_FRAMES = 64 #frames per chunk handed to the writer thread
+RECORD_FLOAT32 = True #store positions and velocities as float32
+RECORD_ENCODING = "delta" #raw, zlib or delta (see recorder.py)
+RECORD_QUEUE_CHUNKS = 16 #chunks waiting for the writer before new ones are dropped
 
 PLANET_MIN_RADIUS = 10
 PLANET_MAX_RADIUS = 200
@@ -30,6 +71,7 @@ SMALL_ARROW_CAP_ANGLE = 20
 PLANET_COLOR = (0, 255, 50)
 ARROW_COLOR_VEL = (50, 130, 200)
 ARROW_COLOR_ACC = (200, 0, 0)
+ARROW_MIN_ZOOM = 0.5 #zoom factor below which the bodies' indicator arrows are hidden
 
 CAM_MOVE_SPEED = 20
 CAM_ZOOM_AMOUNT = 5
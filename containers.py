@@ -1,22 +1,56 @@
 import pygame
 # from objects import CelestialObject
+from body_table import BodyTable
 from celestial_entity import CelestialEntity
+from logger import get_logger
+
+log = get_logger(__name__)
 
 class CelestialSpriteGroup(pygame.sprite.Group):
+    """
+    Sprite group for celestial bodies
+    - Owns the BodyTable that holds the physical state of every member
+    - Members are moved into the table when added and back out to a private row when removed
+    """
     def __init__(self):
         super().__init__()
         self.__id_track = 1
 
+        self.bodies = BodyTable()
+
     def add(self, *celestials):
         for celestial in celestials:
             if isinstance(celestial, CelestialEntity):
-                celestial.id = "CB" + str(self.__id_track)
+                celestial.id = self.__id_track
 
-                print(f"Added a new Celestial Body with id: {celestial.id}")
+                log.debug("Added a new Celestial Body with id: CB%d", celestial.id)
 
                 self.__id_track += 1
         # call the pygame.sprite.Group() add method
-        super().add(*celestials)            
+        super().add(*celestials)
+
+    @property
+    def next_id(self):
+        return self.__id_track
+
+    @next_id.setter
+    def next_id(self, id):
+        """
+        Id given to the next celestial added (eg. to carry on after restored bodies)
+        """
+        self.__id_track = id
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        if isinstance(sprite, CelestialEntity) and sprite.table is not self.bodies:
+            with self.bodies.lock:
+                sprite.table.move_row(sprite.row, self.bodies)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        if isinstance(sprite, CelestialEntity) and sprite.table is self.bodies:
+            with self.bodies.lock:
+                self.bodies.move_row(sprite.row, BodyTable(1))
 
     def draw(self, surface):
-        super().draw(surface)
\ No newline at end of file
+        super().draw(surface)
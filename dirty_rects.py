@@ -0,0 +1,94 @@
+"""
+Dirty rectangle tracking
+- Everything drawn in a frame reports the screen area it covered, the next frame only clears
+  those areas (instead of filling the whole screen) and only the areas drawn in either frame
+  are pushed to the display
+- Frames where most of the screen changes (eg. the camera moved) or too many areas were drawn
+  fall back to a full display update
+"""
+import numpy as np
+import pygame
+
+from constants import DIRTY_RECTS, DIRTY_RECTS_MAX
+
+class DirtyRects():
+    """
+    Screen areas drawn to this frame and last frame
+    - add() each area as it is drawn, clear() at the start of a frame, flush() when it is done
+    - clear() fills the whole screen when last frame's areas are unknown: the first frame, a
+      frame with more than max_rects added, or while disabled
+    - flush() asks for a full update for those frames too, and for any frame invalidate() was
+      called in (invalidate() does not change what the next clear() fills)
+    """
+    def __init__(self, screen_rect : pygame.Rect, max_rects = DIRTY_RECTS_MAX, enabled = DIRTY_RECTS):
+        self.screen_rect = pygame.Rect(screen_rect)
+        self.max_rects = max_rects
+        self.enabled = enabled
+
+        # None when the area is unknown (everything has to be cleared/updated)
+        self.__previous = None
+        self.__current = []
+        self.__full = True
+
+        self.full_updates = 0
+        self.partial_updates = 0
+
+    def invalidate(self):
+        """
+        Push the whole screen this frame (eg. the camera moved, so everything did)
+        """
+        self.__full = True
+
+    def add(self, rect):
+        """
+        Add an area drawn this frame (a Rect, or None for nothing drawn)
+        """
+        if rect is None or self.__current is None:
+            return
+        self.__current.append(rect)
+        if len(self.__current) > self.max_rects:
+            self.__current = None
+
+    def extend(self, rects):
+        for r in rects:
+            self.add(r)
+
+    def add_boxes(self, left, top, width, height):
+        """
+        Add the areas of arrays of boxes drawn this frame, in bulk
+        """
+        if self.__current is None or len(left) == 0:
+            return
+        if len(self.__current) + len(left) > self.max_rects:
+            self.__current = None
+            return
+        boxes = np.stack((left, top, width, height), axis=1).astype(np.int64).tolist()
+        self.__current.extend(pygame.Rect(b) for b in boxes)
+
+    def clear(self, surface : pygame.Surface, color):
+        """
+        Erase what was drawn last frame
+        """
+        if self.__previous is None or not self.enabled:
+            surface.fill(color)
+        else:
+            for r in self.__previous:
+                surface.fill(color, r)
+
+    def flush(self):
+        """
+        End the frame, returns the areas to pass to pygame.display.update() (None for the whole screen)
+        """
+        previous, current = self.__previous, self.__current
+        full = self.__full or previous is None or current is None or not self.enabled
+
+        self.__previous = current
+        self.__current = []
+        self.__full = False
+
+        if full:
+            self.full_updates += 1
+            return None
+        self.partial_updates += 1
+        screen = self.screen_rect
+        return [c for c in (r.clip(screen) for r in previous + current) if c.width and c.height]
@@ -0,0 +1,482 @@
+import os
+import weakref
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from constants import GRAVITY_SOFTENING, GRAVITY_BLOCK_SIZE, BARNES_HUT_THETA, BARNES_HUT_LEAF_SIZE, PM_RESOLUTION, PM_PADDING, PARALLEL_WORKERS
+
+def direct_accelerations(pos, mass, targets = None, softening = GRAVITY_SOFTENING, block_size = GRAVITY_BLOCK_SIZE, out = None):
+    """
+    Direct summation of the gravitational acceleration on each target body
+    - pos: (n, 3) positions, mass: (n,) masses
+    - targets: optional index array / slice of bodies to compute for (default all)
+    - Works in square tiles of block_size x block_size pairs so memory stays bounded
+    """
+    tpos = pos if targets is None else pos[targets]
+    nt = len(tpos)
+    n = len(pos)
+    if out is None:
+        out = np.zeros((nt, 3))
+    else:
+        out[:] = 0
+
+    eps2 = softening*softening
+    # Bodies all sit in the z=0 plane in the interactive scene, skip the z terms then
+    planar = not pos[:, 2].any()
+    for i0 in range(0, nt, block_size):
+        i1 = min(i0+block_size, nt)
+        tx = tpos[i0:i1, 0, None]
+        ty = tpos[i0:i1, 1, None]
+        acc = out[i0:i1]
+        for j0 in range(0, n, block_size):
+            j1 = min(j0+block_size, n)
+            dx = pos[None, j0:j1, 0] - tx
+            dy = pos[None, j0:j1, 1] - ty
+            r2 = dx*dx
+            r2 += dy*dy
+            if not planar:
+                dz = pos[None, j0:j1, 2] - tpos[i0:i1, 2, None]
+                r2 += dz*dz
+            r2 += eps2
+
+            # Zero separation means the body itself (or an exact overlap), which exerts no force
+            r2[r2 == 0] = np.inf
+            w = np.sqrt(r2)
+            w *= r2
+            np.divide(mass[None, j0:j1], w, out=w)
+
+            acc[:, 0] += (w*dx).sum(axis=1)
+            acc[:, 1] += (w*dy).sum(axis=1)
+            if not planar:
+                acc[:, 2] += (w*dz).sum(axis=1)
+
+    return out
+
+class GravityEngine():
+    """
+    Base class for gravity solvers
+    - accelerations() returns the acceleration on every target body from every body
+    """
+    name = ''
+
+    def accelerations(self, pos, mass, targets = None):
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Release any resources held by the engine
+        """
+        pass
+
+class DirectGravity(GravityEngine):
+    """
+    O(N^2) all-pairs gravity, vectorized over tiles of bodies
+    """
+    name = 'direct'
+
+    def __init__(self, softening = GRAVITY_SOFTENING, block_size = GRAVITY_BLOCK_SIZE):
+        self.softening = softening
+        self.block_size = block_size
+
+    def accelerations(self, pos, mass, targets = None):
+        return direct_accelerations(pos, mass, targets, self.softening, self.block_size)
+
+def _part1by1(v):
+    """
+    Spread the low 16 bits of v so there is a zero bit between each (for Morton codes)
+    """
+    v = v & 0x0000ffff
+    v = (v | (v << 8)) & 0x00ff00ff
+    v = (v | (v << 4)) & 0x0f0f0f0f
+    v = (v | (v << 2)) & 0x33333333
+    v = (v | (v << 1)) & 0x55555555
+    return v
+
+def _ranges(starts, counts):
+    """
+    Concatenation of arange(start, start+count) for each pair, plus the pair each entry came from
+    """
+    total = counts.sum()
+    owner = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.cumsum(counts) - counts
+    return np.arange(total) - offsets[owner] + starts[owner], owner
+
+class QuadTree():
+    """
+    Flat array quadtree over the x/y positions of a set of bodies
+    - Built level by level from the bodies sorted by Morton code
+    - Every node holds the range of (sorted) bodies it contains, its mass, centre of mass and width
+    - Children of a node are stored contiguously: child_first[i] .. child_first[i]+child_count[i]
+    """
+    MAX_DEPTH = 16
+
+    def __init__(self, pos, mass, leaf_size = BARNES_HUT_LEAF_SIZE):
+        n = len(pos)
+        x = pos[:, 0]
+        y = pos[:, 1]
+        xmin = x.min()
+        ymin = y.min()
+        size = max(x.max()-xmin, y.max()-ymin)
+        size = size*(1+1e-9) if size > 0 else 1.0
+
+        # Sort bodies along a Z-order curve so every node is a contiguous range
+        cells = 1 << self.MAX_DEPTH
+        ix = np.clip(((x - xmin)/size*cells).astype(np.int64), 0, cells-1)
+        iy = np.clip(((y - ymin)/size*cells).astype(np.int64), 0, cells-1)
+        code = _part1by1(ix) | (_part1by1(iy) << 1)
+        self.order = np.argsort(code, kind='stable')
+        code = code[self.order]
+        self.x = x[self.order]
+        self.y = y[self.order]
+        self.m = mass[self.order]
+
+        # Padded copies so reduceat can take n as a range end
+        mp = np.append(self.m, 0.0)
+        mxp = np.append(self.m*self.x, 0.0)
+        myp = np.append(self.m*self.y, 0.0)
+
+        starts = [np.zeros(1, dtype=np.int64)]
+        ends = [np.full(1, n, dtype=np.int64)]
+        sizes = [np.full(1, size)]
+        child_first = []
+        child_count = []
+        n_nodes = 1
+        for level in range(self.MAX_DEPTH + 1):
+            s = starts[-1]
+            e = ends[-1]
+            internal = (e - s > leaf_size) if level < self.MAX_DEPTH else np.zeros(len(s), dtype=bool)
+
+            first = np.zeros(len(s), dtype=np.int64)
+            count = np.zeros(len(s), dtype=np.int64)
+            if internal.any():
+                ps = s[internal]
+                pe = e[internal]
+                idx, parent = _ranges(ps, pe - ps)
+
+                # A child starts at each parent start and wherever the next level's key changes
+                key = code[idx] >> (2*(self.MAX_DEPTH - level - 1))
+                new_run = np.ones(len(idx), dtype=bool)
+                new_run[1:] = key[1:] != key[:-1]
+                new_run[np.cumsum(pe - ps) - (pe - ps)] = True
+
+                cs = idx[new_run]
+                cparent = parent[new_run]
+                ce = np.minimum(np.append(cs[1:], n), pe[cparent])
+
+                ccount = np.bincount(cparent, minlength=len(ps))
+                count[internal] = ccount
+                first[internal] = n_nodes + np.cumsum(ccount) - ccount
+                n_nodes += len(cs)
+
+                starts.append(cs)
+                ends.append(ce)
+                sizes.append(np.full(len(cs), size/(2 << level)))
+
+            child_first.append(first)
+            child_count.append(count)
+            if not internal.any():
+                break
+
+        self.start = np.concatenate(starts)
+        self.end = np.concatenate(ends)
+        self.size = np.concatenate(sizes)
+        self.child_first = np.concatenate(child_first)
+        self.child_count = np.concatenate(child_count)
+
+        bounds = np.empty(2*len(self.start), dtype=np.int64)
+        bounds[0::2] = self.start
+        bounds[1::2] = self.end
+        self.mass = np.add.reduceat(mp, bounds)[0::2]
+        mx = np.add.reduceat(mxp, bounds)[0::2]
+        my = np.add.reduceat(myp, bounds)[0::2]
+        has_mass = self.mass > 0
+        self.comx = np.divide(mx, self.mass, out=self.x[self.start].copy(), where=has_mass)
+        self.comy = np.divide(my, self.mass, out=self.y[self.start].copy(), where=has_mass)
+
+    def __len__(self):
+        return len(self.start)
+
+class BarnesHutGravity(GravityEngine):
+    """
+    O(N log N) gravity using a Barnes-Hut quadtree rebuilt every step
+    - Bodies are treated as lying in the x/y plane (pos.z is always 0 in a scene)
+    - theta is the opening angle: a node of width s at distance d is used as a single
+      mass when s/d < theta (0 gives the exact direct sum)
+    - All targets walk the tree together as arrays of (target, node) pairs, in chunks
+    """
+    name = 'barnes_hut'
+
+    def __init__(self, theta = BARNES_HUT_THETA, softening = GRAVITY_SOFTENING, leaf_size = BARNES_HUT_LEAF_SIZE, chunk_size = 4096):
+        self.theta = theta
+        self.softening = softening
+        self.leaf_size = leaf_size
+        self.chunk_size = chunk_size
+
+    def accelerations(self, pos, mass, targets = None):
+        tpos = pos if targets is None else pos[targets]
+        out = np.zeros((len(tpos), 3))
+        if len(pos) == 0 or len(tpos) == 0:
+            return out
+
+        tree = QuadTree(pos, mass, self.leaf_size)
+        for i0 in range(0, len(tpos), self.chunk_size):
+            i1 = min(i0+self.chunk_size, len(tpos))
+            self.__walk(tree, tpos[i0:i1, 0], tpos[i0:i1, 1], out[i0:i1])
+
+        return out
+
+    def __walk(self, tree, tx, ty, out):
+        nt = len(tx)
+        eps2 = self.softening*self.softening
+        theta2 = self.theta*self.theta
+
+        t = np.arange(nt)
+        node = np.zeros(nt, dtype=np.int64)
+        while len(t):
+            dx = tree.comx[node] - tx[t]
+            dy = tree.comy[node] - ty[t]
+            r2 = dx*dx + dy*dy
+            far = tree.size[node]**2 < theta2*r2
+            leaf = tree.child_count[node] == 0
+
+            # Far enough away: the whole node acts as one mass at its centre of mass
+            if far.any():
+                self.__accumulate(out, nt, t[far], dx[far], dy[far], r2[far] + eps2, tree.mass[node[far]])
+
+            # Close leaves: sum over their bodies directly
+            near_leaf = ~far & leaf
+            if near_leaf.any():
+                lt = t[near_leaf]
+                ln = node[near_leaf]
+                body, owner = _ranges(tree.start[ln], tree.end[ln] - tree.start[ln])
+                bt = lt[owner]
+                bdx = tree.x[body] - tx[bt]
+                bdy = tree.y[body] - ty[bt]
+                self.__accumulate(out, nt, bt, bdx, bdy, bdx*bdx + bdy*bdy + eps2, tree.m[body])
+
+            # Close internal nodes: descend into their children
+            opened = ~far & ~leaf
+            ot = t[opened]
+            on = node[opened]
+            node, owner = _ranges(tree.child_first[on], tree.child_count[on])
+            t = ot[owner]
+
+    def __accumulate(self, out, nt, t, dx, dy, r2, m):
+        # Zero separation is the body itself, which exerts no force
+        r2[r2 == 0] = np.inf
+        w = m/(r2*np.sqrt(r2))
+        out[:, 0] += np.bincount(t, weights=w*dx, minlength=nt)
+        out[:, 1] += np.bincount(t, weights=w*dy, minlength=nt)
+
+class ParticleMeshGravity(GravityEngine):
+    """
+    Near-linear cost gravity on a mesh for large, dense particle clouds
+    - Masses are deposited onto a resolution x resolution grid with cloud-in-cell weights
+    - The potential is the grid convolved with the (softened) 1/r Green's function, done with
+      FFTs on a grid zero-padded to twice the size so the boundary is isolated, not periodic
+    - Accelerations are the central-difference gradient of the potential, interpolated back
+      to the bodies with the same cloud-in-cell weights
+    - Forces closer than a couple of cells are smoothed out, so this suits clouds, not tight orbits
+    - padding is the extra space left around the bodies as a fraction of their extent
+    """
+    name = 'particle_mesh'
+
+    def __init__(self, resolution = PM_RESOLUTION, padding = PM_PADDING, softening = GRAVITY_SOFTENING):
+        self.resolution = resolution
+        self.padding = padding
+        self.softening = softening
+
+        self.__kernel_key = None
+        self.__kernel_fft = None
+
+    def accelerations(self, pos, mass, targets = None):
+        n = len(pos)
+        out = np.zeros((n, 3))
+        if n == 0:
+            return out if targets is None else out[targets]
+
+        res = self.resolution
+        x = pos[:, 0]
+        y = pos[:, 1]
+        xmin = x.min()
+        ymin = y.min()
+        extent = max(x.max()-xmin, y.max()-ymin)
+        extent = extent if extent > 0 else 1.0
+
+        # Square grid with the padding plus one spare cell on each side for the CIC stencil
+        cell = extent*(1 + 2*self.padding)/(res - 2)
+        x0 = (xmin + x.max())/2 - res*cell/2
+        y0 = (ymin + y.max())/2 - res*cell/2
+
+        i, j, wx, wy = self.__cic(x, y, x0, y0, cell)
+        rho = np.zeros((res, res))
+        for di, dj, w in self.__stencil(wx, wy):
+            rho += np.bincount(((i+di)*res + j+dj), weights=w*mass, minlength=res*res).reshape(res, res)
+
+        phi = np.fft.irfft2(np.fft.rfft2(rho, s=(2*res, 2*res)) * self.__kernel(cell), s=(2*res, 2*res))[:res, :res]
+
+        gx, gy = np.gradient(phi, cell)
+        for di, dj, w in self.__stencil(wx, wy):
+            out[:, 0] -= w*gx[i+di, j+dj]
+            out[:, 1] -= w*gy[i+di, j+dj]
+
+        return out if targets is None else out[targets]
+
+    def __cic(self, x, y, x0, y0, cell):
+        # Position in cell units relative to cell centres
+        u = (x - x0)/cell - 0.5
+        v = (y - y0)/cell - 0.5
+        i = np.clip(np.floor(u).astype(np.int64), 0, self.resolution-2)
+        j = np.clip(np.floor(v).astype(np.int64), 0, self.resolution-2)
+        return i, j, u - i, v - j
+
+    def __stencil(self, wx, wy):
+        return ((0, 0, (1-wx)*(1-wy)), (1, 0, wx*(1-wy)), (0, 1, (1-wx)*wy), (1, 1, wx*wy))
+
+    def __kernel(self, cell):
+        """
+        FFT of the Green's function -1/r on the doubled grid (cached per resolution/softening)
+        """
+        res = self.resolution
+        soft = max(self.softening/cell, 1.0)
+        key = (res, soft)
+        if key != self.__kernel_key:
+            d = np.arange(2*res)
+            d = np.where(d < res, d, d - 2*res)
+            r2 = d[:, None]**2 + d[None, :]**2 + soft*soft
+            self.__kernel_fft = np.fft.rfft2(-1/np.sqrt(r2))
+            self.__kernel_key = key
+        # The kernel is built in cell units, distances scale with the cell size
+        return self.__kernel_fft/cell
+
+# Shared memory blocks attached inside a worker process, by name
+_worker_blocks = {}
+
+def _attach_block(name):
+    shm = _worker_blocks.get(name)
+    if shm is None:
+        # Spawned workers share the parent's resource tracker, so the parent's unlink is the only cleanup
+        shm = shared_memory.SharedMemory(name=name)
+        _worker_blocks[name] = shm
+    return shm
+
+def _parallel_task(names, capacity, n, n_targets, start, stop, softening, block_size):
+    """
+    Worker side of ParallelGravity: direct sum for targets [start, stop) straight into shared memory
+    """
+    # Drop blocks from before the parent last grew its buffers
+    for old in [k for k in _worker_blocks if k not in names]:
+        _worker_blocks.pop(old).close()
+
+    pos_name, mass_name, targets_name, acc_name = names
+    pos = np.ndarray((capacity, 3), buffer=_attach_block(pos_name).buf)[:n]
+    mass = np.ndarray(capacity, buffer=_attach_block(mass_name).buf)[:n]
+    acc = np.ndarray((capacity, 3), buffer=_attach_block(acc_name).buf)
+    if n_targets < 0:
+        targets = slice(start, stop)
+    else:
+        targets = np.ndarray(capacity, dtype=np.int64, buffer=_attach_block(targets_name).buf)[start:stop]
+
+    direct_accelerations(pos, mass, targets, softening, block_size, out=acc[start:stop])
+    return stop - start
+
+def _release_parallel(pool, blocks):
+    pool.shutdown(wait=True, cancel_futures=True)
+    for shm in blocks:
+        shm.close()
+        shm.unlink()
+
+class ParallelGravity(GravityEngine):
+    """
+    Direct summation split across a pool of worker processes by body range
+    - Positions, masses, target indices and results live in multiprocessing.shared_memory,
+      each step only a small (range, sizes) tuple is sent to each worker
+    - The pool and buffers are created on first use and released by close()
+    """
+    name = 'parallel'
+
+    def __init__(self, workers = PARALLEL_WORKERS, softening = GRAVITY_SOFTENING, block_size = GRAVITY_BLOCK_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.softening = softening
+        self.block_size = block_size
+
+        self.__pool = None
+        self.__blocks = []
+        self.__capacity = 0
+        self.__finalizer = None
+
+    def accelerations(self, pos, mass, targets = None):
+        n = len(pos)
+        if targets is not None:
+            targets = np.arange(n)[targets]
+        nt = n if targets is None else len(targets)
+        if nt == 0:
+            return np.zeros((0, 3))
+
+        self.__reserve(n)
+        cap = self.__capacity
+        pos_shm, mass_shm, targets_shm, acc_shm = self.__blocks
+        np.ndarray((cap, 3), buffer=pos_shm.buf)[:n] = pos
+        np.ndarray(cap, buffer=mass_shm.buf)[:n] = mass
+        if targets is not None:
+            np.ndarray(cap, dtype=np.int64, buffer=targets_shm.buf)[:nt] = targets
+
+        names = tuple(b.name for b in self.__blocks)
+        n_targets = -1 if targets is None else nt
+        bounds = np.linspace(0, nt, min(self.workers, nt) + 1).astype(int)
+        futures = [self.__pool.submit(_parallel_task, names, cap, n, n_targets, int(a), int(b), self.softening, self.block_size)
+                   for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+        for f in futures:
+            f.result()
+
+        return np.ndarray((cap, 3), buffer=acc_shm.buf)[:nt].copy()
+
+    def close(self):
+        if self.__finalizer:
+            self.__finalizer()
+        self.__pool = None
+        self.__blocks = []
+        self.__capacity = 0
+
+    def __reserve(self, n):
+        """
+        Make sure the pool exists and the shared buffers hold at least n bodies
+        """
+        if self.__pool is None:
+            # Spawn keeps workers independent of whatever threads/state the app has
+            self.__pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        if n <= self.__capacity:
+            return
+
+        old = self.__blocks
+        cap = max(n, 2*self.__capacity, 64)
+        self.__blocks = [shared_memory.SharedMemory(create=True, size=cap*3*8),
+                         shared_memory.SharedMemory(create=True, size=cap*8),
+                         shared_memory.SharedMemory(create=True, size=cap*8),
+                         shared_memory.SharedMemory(create=True, size=cap*3*8)]
+        self.__capacity = cap
+        for shm in old:
+            shm.close()
+            shm.unlink()
+
+        if self.__finalizer:
+            self.__finalizer.detach()
+        self.__finalizer = weakref.finalize(self, _release_parallel, self.__pool, list(self.__blocks))
+
+ENGINES = {
+    DirectGravity.name : DirectGravity,
+    BarnesHutGravity.name : BarnesHutGravity,
+    ParticleMeshGravity.name : ParticleMeshGravity,
+    ParallelGravity.name : ParallelGravity
+}
+
+def make_engine(name, **kwargs) -> GravityEngine:
+    """
+    Build a gravity engine from its registered name
+    """
+    try:
+        return ENGINES[name.lower()](**kwargs)
+    except KeyError:
+        raise ValueError(f"Unknown gravity engine: '{name}', choose from {list(ENGINES)}")
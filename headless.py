@@ -0,0 +1,154 @@
+"""
+Headless batch simulation
+- Loads initial conditions, advances the physics N steps and writes the results to disk
+- Never imports pygame: no window, no sprites, no Surfaces
+
+Usage:
+    python headless.py initial.npz --steps 10000 --engine barnes_hut --out result.npz
+
+Initial conditions are either an .npz file with arrays 'pos' and optionally 'vel', 'mass',
+'radius', 'density', 'ids', a .csv file with a header naming the columns
+x, y[, z], vx, vy[, vz], mass, radius, density, id (any missing column defaults as in the GUI),
+or a .npy checkpoint (see checkpoint.py). States written to a .npy path are checkpoints too.
+"""
+import argparse
+import math
+import os
+import sys
+import time
+import numpy as np
+
+from body_table import BodyTable
+from checkpoint import load_checkpoint, restore_bodies, save_checkpoint
+from constants import DELTA_T, GRAVITY_ENGINE, INTEGRATOR, PLANET_DEFAULT_DENSITY, RECORD_STRIDE, RECORD_ENCODING
+from gravity import ENGINES
+from integrators import INTEGRATORS
+from recorder import TrajectoryRecorder, ENCODINGS
+from simulation import Simulation
+
+def load_initial_conditions(path, bodies : BodyTable = None) -> BodyTable:
+    """
+    Load bodies from an .npz or .csv file into a BodyTable (a new one if not given)
+    """
+    if bodies is None:
+        bodies = BodyTable()
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        records, header = load_checkpoint(path)
+        return restore_bodies(records, bodies)
+    elif ext == ".npz":
+        with np.load(path) as f:
+            cols = {k: f[k] for k in f.files}
+        pos = cols["pos"]
+        vel = cols.get("vel")
+    elif ext == ".csv":
+        data = np.genfromtxt(path, delimiter=",", names=True)
+        data = np.atleast_1d(data)
+        names = data.dtype.names
+        cols = {k: data[k] for k in ("mass", "radius", "density") if k in names}
+        if "id" in names:
+            cols["ids"] = data["id"].astype(np.int64)
+        pos = np.column_stack([data[k] if k in names else np.zeros(len(data)) for k in ("x", "y", "z")])
+        vel = np.column_stack([data[k] if k in names else np.zeros(len(data)) for k in ("vx", "vy", "vz")])
+    else:
+        raise ValueError(f"Unsupported initial conditions file: '{path}' (use .npz, .csv or .npy)")
+
+    n = len(pos)
+    radius = cols.get("radius", np.ones(n))
+    density = cols.get("density", np.full(n, PLANET_DEFAULT_DENSITY))
+    # Same mass as a CelestialEntity of that radius and density
+    mass = cols.get("mass", density*(4/3*math.pi*radius**3))
+    ids = cols.get("ids", np.arange(len(bodies)+1, len(bodies)+n+1))
+
+    bodies.extend(pos, vel=vel, mass=mass, radius=radius, density=density, ids=ids)
+    return bodies
+
+def save_state(path, simulation : Simulation):
+    """
+    Write the current body table to an .npz file, or a checkpoint if the path ends in .npy
+    """
+    if path.lower().endswith(".npy"):
+        save_checkpoint(path, simulation)
+        return
+
+    b = simulation.bodies
+    np.savez(path, pos=b.pos, vel=b.vel, acc=b.acc, mass=b.mass, radius=b.radius,
+             density=b.density, ids=b.ids, time=simulation.time, steps=simulation.steps)
+
+def run(initial, steps, dt = DELTA_T, engine = GRAVITY_ENGINE, out = None, save_every = 0, report_every = 0, integrator = INTEGRATOR, block_timesteps = False, collisions = False, record = None, record_stride = RECORD_STRIDE, record_encoding = RECORD_ENCODING) -> float:
+    """
+    Run a headless simulation, returns the measured steps per second
+    """
+    bodies = load_initial_conditions(initial)
+    simulation = Simulation(bodies, engine=engine, dt=dt, integrator=integrator, block_timesteps=block_timesteps, collisions=collisions)
+    integrator = "block timesteps" if simulation.block_timesteps else simulation.integrator.name
+    print(f"Loaded {len(bodies)} bodies from {initial}, engine: {simulation.engine.name}, "
+          f"integrator: {integrator}, dt: {dt}")
+
+    recorder = TrajectoryRecorder(record, stride=record_stride, encoding=record_encoding) if record else None
+
+    stem, ext = os.path.splitext(out) if out else (None, None)
+    # Bodies summed over the steps taken, collisions can shrink the count as it runs
+    body_steps = 0
+    try:
+        start = time.perf_counter()
+        if recorder:
+            recorder.record_table(bodies, simulation.time, simulation.steps)
+        for i in range(1, steps+1):
+            body_steps += len(bodies)
+            simulation.step()
+            if recorder:
+                recorder.record_table(bodies, simulation.time, simulation.steps)
+
+            if save_every and out and i % save_every == 0:
+                save_state(f"{stem}_{i:08d}{ext or '.npz'}", simulation)
+            if report_every and i % report_every == 0:
+                print(f"Step {i}/{steps}: {i/(time.perf_counter()-start):.1f} steps/sec")
+        elapsed = time.perf_counter() - start
+    finally:
+        simulation.close()
+        if recorder:
+            recorder.close()
+
+    rate = steps/elapsed if elapsed > 0 else float("inf")
+    print(f"Ran {steps} steps of {len(bodies)} bodies in {elapsed:.3f}s: {rate:.1f} steps/sec")
+    if simulation.collisions:
+        print(f"Bodies merged by collisions: {simulation.collisions.merged}")
+    if simulation.block_timesteps:
+        evaluations = simulation.block_timesteps.evaluations
+        per_body = f" ({evaluations/body_steps:.2f} per body per step)" if body_steps else ""
+        print(f"Body force evaluations: {evaluations}{per_body}")
+
+    if recorder:
+        print(f"Recorded {recorder.frames} frames ({recorder.dropped} dropped), "
+              f"{recorder.bytes_written} bytes to {record}")
+    if out:
+        save_state(out, simulation)
+        print(f"Wrote final state to {out}")
+
+    return rate
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Run the gravity simulation without a display")
+    parser.add_argument("initial", help="initial conditions (.npz, .csv or a .npy checkpoint)")
+    parser.add_argument("--steps", type=int, default=1000, help="number of physics steps")
+    parser.add_argument("--dt", type=float, default=DELTA_T, help="simulation time per step")
+    parser.add_argument("--engine", default=GRAVITY_ENGINE, choices=list(ENGINES), help="gravity engine")
+    parser.add_argument("--integrator", default=INTEGRATOR, choices=list(INTEGRATORS), help="time integrator")
+    parser.add_argument("--block-timesteps", action="store_true", help="per-body power-of-two timesteps")
+    parser.add_argument("--collisions", action="store_true", help="merge bodies that overlap")
+    parser.add_argument("--out", help="file to write the final state to (.npz, or .npy for a checkpoint)")
+    parser.add_argument("--save-every", type=int, default=0, help="also write the state every N steps")
+    parser.add_argument("--record", help="trajectory file to stream the body states to")
+    parser.add_argument("--record-stride", type=int, default=RECORD_STRIDE, help="record every N steps")
+    parser.add_argument("--record-encoding", default=RECORD_ENCODING, choices=list(ENCODINGS), help="trajectory encoding")
+    parser.add_argument("--report-every", type=int, default=0, help="print steps/sec every N steps")
+    args = parser.parse_args(argv)
+
+    run(args.initial, args.steps, args.dt, args.engine, args.out, args.save_every, args.report_every, args.integrator, args.block_timesteps, args.collisions,
+        args.record, args.record_stride, args.record_encoding)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
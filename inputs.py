@@ -4,11 +4,32 @@ import weakref
 
 from actions import ActionContainer
 
+KEY_EVENTS = (pygame.KEYDOWN, pygame.KEYUP)
+MOUSE_BUTTON_EVENTS = (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP)
+
+def route(event):
+    """
+    (event type, key/button) an event is dispatched on, the code is None for other events
+    """
+    t = event.type
+    if t in KEY_EVENTS:
+        return (t, event.key)
+    if t in MOUSE_BUTTON_EVENTS:
+        return (t, event.button)
+    return (t, None)
+
 class ButtonInput:
     def match(self, event) -> bool:
          # Implement in inheriting class
         return False
 
+    def routes(self) -> tuple:
+        """
+        The route() keys of every event match() accepts
+        """
+        # Implement in inheriting class
+        return ()
+
     def update(self, event):
         if self.match(event):
             return self.pressed(event)
@@ -25,6 +46,9 @@ class KeyPress(ButtonInput):
     def match(self, event):
         return event.type in (pygame.KEYDOWN, pygame.KEYUP) and event.key == self.value
 
+    def routes(self):
+        return tuple((t, self.value) for t in KEY_EVENTS)
+
     def pressed(self, event) -> bool:
         """Whether a matching event is a press or a release"""
         return event.type == pygame.KEYDOWN
@@ -36,6 +60,9 @@ class MousePress(ButtonInput):
     def match(self, event):
         return event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP) and event.button == self.value
 
+    def routes(self):
+        return tuple((t, self.value) for t in MOUSE_BUTTON_EVENTS)
+
     def pressed(self, event) -> bool:
         """Whether a matching event is a press or a release"""
         return event.type == pygame.MOUSEBUTTONDOWN
@@ -47,24 +74,92 @@ class MouseMove(ButtonInput):
     def match(self, event):
         return event.type is (pygame.MOUSEMOTION)
 
+    def routes(self):
+        return ((pygame.MOUSEMOTION, None),)
+
     def pressed(self, event) -> bool:
         """Whether a matching event is a press or a release"""
         return True
 
 class Inputs():
+    """
+    Named Buttons, with each event routed only to the buttons it triggers
+    - Buttons are indexed by the (event type, key/button) of their trigger, so an event costs one
+      dict lookup however many buttons are registered
+    - update() only runs the buttons that have something to do: triggered this frame, held down
+      or with always() actions. Idle buttons cost nothing per frame
+    """
     def __init__(self):
         self.inputs = {}
 
+        # route() key -> buttons, and each button's registration order (buttons update in it)
+        self._routes = {}
+        self._order = {}
+        self._next_order = 0
+
+        # Buttons triggered by the last handle_events(), held down, and with always() actions
+        self._triggered = set()
+        self._held = set()
+        self._polled = set()
+
     def update(self, dt):
-        for i in self.inputs.values():
-            i.update(dt)
+        active = self._triggered | self._held | self._polled
+        if not active:
+            return
+        for b in sorted(active, key=self._order.__getitem__):
+            b.update(dt)
+            if b.held:
+                self._held.add(b)
+            else:
+                self._held.discard(b)
+            # Stop polling once all its always() actions are gone
+            if b in self._polled and not b.polled:
+                self._polled.discard(b)
 
     def register(self, name, button):
+        old = self.inputs.get(name)
+        if old is not None:
+            self.unregister(name)
+
         self.inputs[name] = button
+        self._order[button] = self._next_order
+        self._next_order += 1
+        for key in button.trigger.routes():
+            self._routes.setdefault(key, []).append(button)
+
+        button._owner = self
+        if button.polled:
+            self._polled.add(button)
+
+    def unregister(self, name):
+        button = self.inputs.pop(name)
+        for key in button.trigger.routes():
+            self._routes[key].remove(button)
+        del self._order[button]
+        self._triggered.discard(button)
+        self._held.discard(button)
+        self._polled.discard(button)
+        button._owner = None
+
+    def poll(self, button):
+        """
+        Called by a registered button when it gets always() actions, it is then updated every frame
+        """
+        if button in self._order:
+            self._polled.add(button)
 
     def handle_events(self, events):
-        for i in self.inputs.values():
-            i.process_events(events)
+        for b in self._triggered:
+            b.reset_events()
+        self._triggered = set()
+
+        routes = self._routes
+        for event in events:
+            buttons = routes.get(route(event))
+            if buttons:
+                for b in buttons:
+                    b.handle_event(event)
+                    self._triggered.add(b)
 
 class Button():
     def __init__(self, button_type, button):
@@ -84,16 +179,46 @@ class Button():
         self._on_release = ActionContainer()
         self._on_press_repeat = ActionContainer()
 
-    def process_events(self, events):
+        # Inputs this button is registered with (see Inputs.register())
+        self._owner = None
+
+    @property
+    def held(self) -> bool:
+        """
+        Whether the button is down, so update() has to keep running its repeat actions
+        """
+        return self._pressed_time > 0
+
+    @property
+    def polled(self) -> bool:
+        """
+        Whether the button has live always() actions, which run every update()
+        """
+        return self._always.prune()
+
+    def reset_events(self):
         self._pressed_now = False
         self._released_now = False
+
+    def handle_event(self, event):
+        """
+        Take one event routed to this button (its trigger must match() it)
+        """
+        if self.trigger.pressed(event):
+            self._pressed_now = True
+        else:
+            self._released_now = True
+
+    def process_events(self, events):
+        """
+        Take the events of a frame, scanning for the ones that match the trigger
+        - Inputs routes events to its buttons instead (see Inputs.handle_events())
+        """
+        self.reset_events()
         
         for event in events:
             if self.trigger.match(event):
-                if self.trigger.pressed(event):
-                    self._pressed_now = True
-                else:
-                    self._released_now = True
+                self.handle_event(event)
 
     def update(self, dt):
         self._always()
@@ -131,7 +256,10 @@ class Button():
                 act.repeat_count = 0
 
     def always(self, func):
-        return self._always.add(func)
+        action = self._always.add(func)
+        if self._owner is not None:
+            self._owner.poll(self)
+        return action
 
     def on_press(self, func):
         return self._on_press.add(func)
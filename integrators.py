@@ -0,0 +1,111 @@
+class Integrator():
+    """
+    Base class for time integrators
+    - step() advances the pos, vel and acc arrays in place by dt
+    - accel(pos) returns the acceleration of every body at the given positions
+    - If uses_acc is set, step() expects acc to already hold the acceleration at pos
+    - acc is left holding the last force evaluation of the step
+    """
+    name = ''
+    uses_acc = False
+    evaluations = 1 #force evaluations per step
+
+    def step(self, pos, vel, acc, accel, dt):
+        raise NotImplementedError
+
+class EulerIntegrator(Integrator):
+    """
+    The original update: one force evaluation, then position and velocity from it
+    (first order, drifts in energy unless dt is kept small)
+    """
+    name = 'euler'
+
+    def step(self, pos, vel, acc, accel, dt):
+        acc[:] = accel(pos)
+        pos += vel*dt + 0.5*acc*dt
+        vel += acc*dt
+
+class LeapfrogIntegrator(Integrator):
+    """
+    Kick-drift-kick leapfrog (second order, symplectic)
+    """
+    name = 'leapfrog'
+    uses_acc = True
+
+    def step(self, pos, vel, acc, accel, dt):
+        vel += 0.5*dt*acc
+        pos += dt*vel
+        acc[:] = accel(pos)
+        vel += 0.5*dt*acc
+
+class VelocityVerletIntegrator(Integrator):
+    """
+    Velocity Verlet (second order, symplectic)
+    """
+    name = 'verlet'
+    uses_acc = True
+
+    def step(self, pos, vel, acc, accel, dt):
+        pos += dt*vel + 0.5*dt*dt*acc
+        new_acc = accel(pos)
+        vel += 0.5*dt*(acc + new_acc)
+        acc[:] = new_acc
+
+class YoshidaIntegrator(Integrator):
+    """
+    Yoshida 4th order symplectic integrator (three leapfrog sub-steps, three force evaluations)
+    """
+    name = 'yoshida4'
+    evaluations = 3
+
+    W1 = 1/(2 - 2**(1/3))
+    W0 = -2**(1/3)/(2 - 2**(1/3))
+    C = (W1/2, (W0 + W1)/2, (W0 + W1)/2, W1/2)
+    D = (W1, W0, W1)
+
+    def step(self, pos, vel, acc, accel, dt):
+        for c, d in zip(self.C, self.D):
+            pos += c*dt*vel
+            acc[:] = accel(pos)
+            vel += d*dt*acc
+        pos += self.C[3]*dt*vel
+
+class RK4Integrator(Integrator):
+    """
+    Classic 4th order Runge-Kutta on positions and velocities (not symplectic, four evaluations)
+    """
+    name = 'rk4'
+    evaluations = 4
+
+    def step(self, pos, vel, acc, accel, dt):
+        x0 = pos.copy()
+        v0 = vel.copy()
+
+        a1 = accel(x0)
+        v2 = v0 + 0.5*dt*a1
+        a2 = accel(x0 + 0.5*dt*v0)
+        v3 = v0 + 0.5*dt*a2
+        a3 = accel(x0 + 0.5*dt*v2)
+        v4 = v0 + dt*a3
+        a4 = accel(x0 + dt*v3)
+
+        pos += dt/6*(v0 + 2*v2 + 2*v3 + v4)
+        vel += dt/6*(a1 + 2*a2 + 2*a3 + a4)
+        acc[:] = a4
+
+INTEGRATORS = {
+    EulerIntegrator.name : EulerIntegrator,
+    LeapfrogIntegrator.name : LeapfrogIntegrator,
+    VelocityVerletIntegrator.name : VelocityVerletIntegrator,
+    YoshidaIntegrator.name : YoshidaIntegrator,
+    RK4Integrator.name : RK4Integrator
+}
+
+def make_integrator(name) -> Integrator:
+    """
+    Build an integrator from its registered name
+    """
+    try:
+        return INTEGRATORS[name.lower()]()
+    except KeyError:
+        raise ValueError(f"Unknown integrator: '{name}', choose from {list(INTEGRATORS)}")
@@ -0,0 +1,77 @@
+"""
+Logging
+- Thin setup around the standard logging module: every module gets a child of the
+  'gravity_simulator' logger with get_logger(__name__)
+- Messages below the logger's level are dropped before they are formatted, hot paths use
+  %-style arguments (never f-strings) so a disabled message costs one level check
+- The last LOG_RING_SIZE messages are also kept in memory, dump() writes them out
+"""
+import collections
+import logging
+import sys
+
+from constants import LOG_LEVEL, LOG_RING_LEVEL, LOG_RING_SIZE, LOG_DUMP_PATH
+
+ROOT = "gravity_simulator"
+
+DUMP_FORMAT = "%(asctime)s.%(msecs)03d %(levelname)-7s %(name)s: %(message)s"
+DUMP_DATE_FORMAT = "%H:%M:%S"
+
+class RingBufferHandler(logging.Handler):
+    """
+    Keeps the most recent log records in memory
+    - Records are only formatted when read, so keeping them is cheap
+    """
+    def __init__(self, capacity = LOG_RING_SIZE, level = LOG_RING_LEVEL):
+        super().__init__(level)
+        self.records = collections.deque(maxlen=capacity)
+        self.setFormatter(logging.Formatter(DUMP_FORMAT, DUMP_DATE_FORMAT))
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def lines(self):
+        return [self.format(r) for r in list(self.records)]
+
+    def clear(self):
+        self.records.clear()
+
+_root = logging.getLogger(ROOT)
+_root.propagate = False
+
+_console = logging.StreamHandler(sys.stdout)
+_console.setFormatter(logging.Formatter("%(message)s"))
+_root.addHandler(_console)
+
+ring = RingBufferHandler()
+_root.addHandler(ring)
+
+def set_levels(console = LOG_LEVEL, ring_level = LOG_RING_LEVEL):
+    """
+    Set the console and ring buffer levels (names or numbers), the logger itself is set to
+    the lower of the two so nothing below both is ever formatted
+    """
+    _console.setLevel(console)
+    ring.setLevel(ring_level)
+    _root.setLevel(min(_console.level, ring.level))
+
+set_levels()
+
+def get_logger(name) -> logging.Logger:
+    """
+    Logger for a module, eg. get_logger(__name__)
+    """
+    return _root.getChild(name)
+
+def dump(path = LOG_DUMP_PATH) -> int:
+    """
+    Write the ring buffer to a file ('-' for stdout), returns the number of lines written
+    """
+    lines = ring.lines()
+    if path == "-":
+        for line in lines:
+            print(line)
+    else:
+        with open(path, "w") as f:
+            f.write("\n".join(lines) + ("\n" if lines else ""))
+    return len(lines)
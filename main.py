@@ -1,13 +1,21 @@
 import pygame
 
-from states import MenuState, DrawState
+from states import MenuState, DrawState, ReplayState
 from inputs import Inputs
-from constants import WINDOW_TITLE, SCREEN_WIDTH, SCREEN_HEIGHT, FPS_CAP
+from profiler import FrameProfiler, ProfilerOverlay
+from dirty_rects import DirtyRects
+import logger
+from surface_cache import body_surfaces
+from text_cache import text_surfaces
+from constants import WINDOW_TITLE, SCREEN_WIDTH, SCREEN_HEIGHT, FPS_CAP, LOG_DUMP_PATH
+
+log = logger.get_logger(__name__)
 
 class App():
     STATES = {
         'menu' : MenuState,
-        'draw' : DrawState
+        'draw' : DrawState,
+        'replay' : ReplayState
     }
 
     def __init__(self, init_state = 'menu'):
@@ -20,9 +28,17 @@ class App():
         # Create screen
         self.__screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 
+        # Screen areas drawn each frame, only those are cleared and pushed to the display
+        self.dirty = DirtyRects(self.__screen.get_rect())
+
         # Main app font
         self.font = pygame.font.SysFont("Arial", 16, False, False)
 
+        # Per-phase frame timings, the overlay is toggled with F3
+        self.profiler = FrameProfiler()
+        self.profiler_overlay = ProfilerOverlay(self.profiler, pygame.font.SysFont("consolas,couriernew,monospace", 14))
+        self.show_profiler = False
+
         # Input pipeline (instance gets replaced by each state init())
         self.inputs = Inputs()
 
@@ -65,38 +81,64 @@ class App():
         pygame.display.set_caption(WINDOW_TITLE)
 
         # Main game loop
+        profiler = self.profiler
         while self.running:
             
             # Get events
-            events = pygame.event.get()
+            with profiler.phase("events"):
+                events = pygame.event.get()
             for event in events:
                 # Handle Quit
                 if event.type == pygame.QUIT:
+                    if self.__state:
+                        self.__state.exit()
+                    # The draw scene is parked while the replay runs
+                    parked = self.__data.pop("draw_scene", None)
+                    if parked:
+                        parked.close()
                     pygame.quit()
                     return 0
+                # Toggle profiler overlay
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                    self.show_profiler = not self.show_profiler
+                # Dump the recent log messages
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_F12:
+                    log.info("Body image cache: %s", body_surfaces.stats())
+                    log.info("Text cache: %s", text_surfaces.stats())
+                    n = logger.dump(LOG_DUMP_PATH)
+                    log.info("Wrote %d log messages to %s", n, LOG_DUMP_PATH)
             
             # Send events to input pipeline
-            self.inputs.handle_events(events)
+            with profiler.phase("input_events"):
+                self.inputs.handle_events(events)
             
             # Set FPS and get frame time
-            delta_time = self.clock.tick(FPS_CAP)
+            with profiler.phase("wait"):
+                delta_time = self.clock.tick(FPS_CAP)
             
             # Update input pipeline
-            self.inputs.update(delta_time)
+            with profiler.phase("input_update"):
+                self.inputs.update(delta_time)
             
             # Update the system
-            self.update(delta_time)
+            with profiler.phase("update"):
+                self.update(delta_time)
             
             # Draw next frame
             self.draw_frame()
 
+            profiler.end_frame()
+
     def update(self, delta_time):
         """
         Update state of the system
         """
         if self.__next_state:
+            if self.__state:
+                self.__state.exit()
             self.__state = self.STATES[self.__next_state.lower()](self)
             self.__next_state = ''
+            self.dirty.invalidate()
         else:
             self.__state.update(delta_time)
 
@@ -109,23 +151,33 @@ class App():
         # self.__screen.fill(bg_color)
 
         # Call .draw() func of state
-        self.__state.draw() # For transient drawing to the screen, (arrows)
+        with self.profiler.phase("draw"):
+            self.__state.draw() # For transient drawing to the screen, (arrows)
         
-        # Draw fps to screen
-        self.__draw_fps()
+            # Draw fps to screen
+            self.__draw_fps()
+
+            if self.show_profiler:
+                self.dirty.add(self.profiler_overlay.draw(self.__screen, (5, 80)))
         
-        # Update the display
-        pygame.display.update()
+        # Update the display, only where something was drawn this frame or last frame
+        with self.profiler.phase("display"):
+            rects = self.dirty.flush()
+            if rects is None:
+                pygame.display.update()
+            elif rects:
+                pygame.display.update(rects)
 
     def __draw_fps(self):
         """
         Draw fps to screen
         """
         txt = f'{round(self.clock.get_fps())} FPS'
-        rtxt = self.font.render(txt, False, pygame.Color('black'))
-        rsiz = self.font.size(txt)
-        self.__screen.blit(rtxt, (SCREEN_WIDTH-rsiz[0]-5, 5))     
+        rtxt = text_surfaces.render(self.font, txt, False, (0, 0, 0))
+        self.dirty.add(self.__screen.blit(rtxt, (SCREEN_WIDTH-rtxt.get_width()-5, 5)))     
 
-app = App('draw')   # Start app in "draw" state, default is menu but no menu yet
-app.run()
+if __name__ == '__main__':
+    # Guarded so worker processes (spawned by the parallel gravity engine) can import this module
+    app = App('draw')   # Start app in "draw" state, default is menu but no menu yet
+    app.run()
 
@@ -0,0 +1,157 @@
+"""
+Frame profiler
+- Times named phases of each frame and keeps the last PROFILER_WINDOW frames of every phase
+- ProfilerOverlay draws min/avg/p99 per phase and a stacked graph of the recent frames
+"""
+import time
+from contextlib import contextmanager
+import numpy as np
+import pygame
+
+from constants import PROFILER_WINDOW
+
+class FrameProfiler():
+    """
+    Rolling per-phase frame timings
+    - Wrap each phase of a frame in 'with profiler.phase(name):', phases may nest and a
+      phase entered several times in one frame is summed
+    - end_frame() closes the frame, phases not entered during it count as 0
+    """
+    def __init__(self, window = PROFILER_WINDOW):
+        self.window = window
+        self.frames = 0
+
+        self.__names = []
+        self.__history = {}
+        self.__current = {}
+
+    @property
+    def names(self):
+        """
+        Phase names, in the order they were first timed
+        """
+        return list(self.__names)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.__current[name] = self.__current.get(name, 0.0) + time.perf_counter() - start
+
+    def end_frame(self):
+        for name in self.__current:
+            if name not in self.__history:
+                self.__names.append(name)
+                self.__history[name] = np.zeros(self.window)
+
+        i = self.frames % self.window
+        for name in self.__names:
+            self.__history[name][i] = self.__current.get(name, 0.0)
+        self.__current.clear()
+        self.frames += 1
+
+    def history(self, name):
+        """
+        Seconds spent in a phase in each of the recent frames, oldest first
+        """
+        h = self.__history.get(name)
+        if h is None:
+            return np.zeros(0)
+        n = min(self.frames, self.window)
+        return np.roll(h, -(self.frames % self.window))[self.window-n:]
+
+    def stats(self, name):
+        """
+        (min, avg, p99) of a phase over the recent frames, in milliseconds
+        """
+        h = self.history(name)
+        if len(h) == 0:
+            return (0.0, 0.0, 0.0)
+        return (h.min()*1000, h.mean()*1000, np.percentile(h, 99)*1000)
+
+class ProfilerOverlay():
+    """
+    Draws a FrameProfiler's statistics table and a stacked graph of the top level phases
+    """
+    # Table rows (phase, indent), phases not listed are added at the end
+    ROWS = (
+        ("events", 0),
+        ("input_events", 0),
+        ("input_update", 0),
+        ("update", 0),
+        ("physics", 1),
+        ("camera", 1),
+        ("gui", 1),
+        ("transients", 1),
+        ("draw", 0),
+        ("display", 0),
+        ("wait", 0)
+    )
+    # Stacked in the graph, bottom up
+    GRAPH = {
+        "events" : (120, 120, 255),
+        "input_events" : (0, 200, 255),
+        "input_update" : (0, 255, 200),
+        "update" : (255, 80, 80),
+        "draw" : (255, 200, 0),
+        "display" : (200, 0, 255)
+    }
+    BG_COLOR = (0, 0, 0, 180)
+    FG_COLOR = (255, 255, 255)
+    GRAPH_HEIGHT = 100
+    GRAPH_SCALE_MS = 1000/60 # a 60 FPS frame is the full graph height
+    LINE_HEIGHT = 18
+    COLUMNS = (190, 260, 350) # right edges of the min, avg and p99 columns
+
+    def __init__(self, profiler : FrameProfiler, font : pygame.font.Font):
+        self.profiler = profiler
+        self.font = font
+
+    def draw(self, surface : pygame.Surface, pos):
+        p = self.profiler
+        names = p.names
+        rows = [r for r in self.ROWS if r[0] in names] + [(n, 0) for n in names if n not in dict(self.ROWS)]
+
+        width = max(p.window, 360)
+        height = (len(rows) + 1)*self.LINE_HEIGHT + self.GRAPH_HEIGHT + 10
+        panel = pygame.Surface((width + 10, height), pygame.SRCALPHA)
+        panel.fill(self.BG_COLOR)
+
+        y = 5
+        self.__row(panel, y, "phase", ("min", "avg", "p99 ms"), self.FG_COLOR)
+        for name, indent in rows:
+            y += self.LINE_HEIGHT
+            lo, avg, p99 = p.stats(name)
+            color = self.GRAPH.get(name, self.FG_COLOR)
+            self.__row(panel, y, "  "*indent + name, (f"{lo:.2f}", f"{avg:.2f}", f"{p99:.2f}"), color)
+
+        # Stacked graph, newest frame on the right
+        base = height - 5
+        top = base - self.GRAPH_HEIGHT
+        scale = self.GRAPH_HEIGHT/self.GRAPH_SCALE_MS*1000
+        stacked = np.zeros(min(p.frames, p.window))
+        x0 = 5 + p.window - len(stacked)
+        for name, color in self.GRAPH.items():
+            h = p.history(name)
+            if len(h) != len(stacked):
+                continue
+            low = base - np.minimum(stacked*scale, self.GRAPH_HEIGHT)
+            stacked = stacked + h
+            high = base - np.minimum(stacked*scale, self.GRAPH_HEIGHT)
+            for x, y1, y2 in zip(range(x0, x0 + len(h)), low.astype(int).tolist(), high.astype(int).tolist()):
+                if y2 < y1:
+                    pygame.draw.line(panel, color, (x, y1), (x, y2))
+        pygame.draw.line(panel, self.FG_COLOR, (5, top), (5 + p.window, top))
+
+        return surface.blit(panel, pos)
+
+    def __row(self, panel, y, label, values, color):
+        """
+        Private function to draw a table row, the values right aligned in fixed columns
+        """
+        panel.blit(self.font.render(label, True, color), (5, y))
+        for i, v in enumerate(values):
+            text = self.font.render(v, True, color)
+            panel.blit(text, (self.COLUMNS[i] - text.get_width(), y))
@@ -0,0 +1,309 @@
+"""
+Trajectory recording
+- Body states are appended to a file in chunks of up to RECORD_CHUNK_FRAMES frames
+- A chunk holds frames of one body table version only (same bodies in the same rows),
+  a new chunk starts whenever bodies are added, removed or merged
+- Chunks are encoded and written by a background thread, the caller only copies the frame
+- TrajectoryReader memory-maps a recording for playback, with an index of every frame
+
+File layout:
+    FILE_MAGIC
+    chunk*: CHUNK_HEADER, ids (int64 x bodies), radius (float64 x bodies),
+            times (float64 x frames), steps (int64 x frames), data (data_size bytes)
+
+'data' is the (frames, bodies, 6) array of pos and vel, float32 or float64, stored as:
+    raw   - as is
+    zlib  - zlib compressed
+    delta - each frame as the bitwise (integer) difference to the previous frame, then zlib
+            compressed; lossless, and slowly moving bodies compress much better
+"""
+import os
+import queue
+import struct
+import threading
+import zlib
+import numpy as np
+
+from body_table import BodyTable
+from constants import RECORD_STRIDE, RECORD_CHUNK_FRAMES, RECORD_FLOAT32, RECORD_ENCODING, RECORD_QUEUE_CHUNKS
+
+FILE_MAGIC = b"GSTRAJ01"
+
+# magic, encoding, float size, frames, bodies, data size
+CHUNK_HEADER = struct.Struct("<4sBBxxIIQ")
+CHUNK_MAGIC = b"CHNK"
+
+FIELDS = 6 # pos xyz, vel xyz
+
+ENCODINGS = ("raw", "zlib", "delta")
+
+def _as_uint(data):
+    return data.view(np.uint32 if data.dtype == np.float32 else np.uint64)
+
+def encode(data, encoding) -> bytes:
+    """
+    Encode a (frames, bodies, FIELDS) array
+    """
+    if encoding == "raw":
+        return data.tobytes()
+    if encoding == "zlib":
+        return zlib.compress(data.tobytes(), 1)
+    if encoding == "delta":
+        bits = _as_uint(data)
+        delta = bits.copy()
+        delta[1:] -= bits[:-1]
+        return zlib.compress(delta.tobytes(), 1)
+    raise ValueError(f"Unknown encoding: '{encoding}', choose from {list(ENCODINGS)}")
+
+def decode(buffer, encoding, dtype, frames, bodies):
+    """
+    Decode a chunk's data back into a (frames, bodies, FIELDS) array
+    - For raw chunks this is a view of 'buffer' (eg. a memory map), nothing is copied
+    """
+    shape = (frames, bodies, FIELDS)
+    if encoding == "raw":
+        return np.frombuffer(buffer, dtype=dtype).reshape(shape)
+    data = np.frombuffer(zlib.decompress(buffer), dtype=dtype).reshape(shape)
+    if encoding == "delta":
+        data = np.cumsum(_as_uint(data), axis=0, dtype=_as_uint(data).dtype).view(dtype)
+    return data
+
+class _Chunk():
+    """
+    Frames being collected for one chunk
+    """
+    def __init__(self, version, ids, radius, frames, dtype):
+        self.version = version
+        self.ids = np.array(ids, dtype=np.int64)
+        self.radius = np.array(radius, dtype=np.float64)
+        self.data = np.empty((frames, len(self.ids), FIELDS), dtype=dtype)
+        self.times = np.empty(frames)
+        self.steps = np.empty(frames, dtype=np.int64)
+        self.count = 0
+
+    @property
+    def full(self):
+        return self.count == len(self.times)
+
+class TrajectoryRecorder():
+    """
+    Streams body states to an append-only trajectory file
+    - record() copies one frame, every 'stride' physics steps, into the current chunk
+    - Full chunks are queued for the writer thread, if it falls more than 'queue_chunks'
+      behind the chunk is dropped (and counted) rather than blocking the caller
+    - close() flushes the last, partial chunk and waits for the writer to finish
+    """
+    def __init__(self, path, stride = RECORD_STRIDE, chunk_frames = RECORD_CHUNK_FRAMES, float32 = RECORD_FLOAT32, encoding = RECORD_ENCODING, queue_chunks = RECORD_QUEUE_CHUNKS):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown encoding: '{encoding}', choose from {list(ENCODINGS)}")
+        self.path = path
+        self.stride = max(int(stride), 1)
+        self.chunk_frames = max(int(chunk_frames), 1)
+        self.dtype = np.dtype(np.float32 if float32 else np.float64)
+        self.encoding = encoding
+
+        self.__chunk = None
+        self.__next_step = None
+
+        # Frames recorded, frames dropped because the writer was behind, bytes written
+        self.frames = 0
+        self.dropped = 0
+        self.bytes_written = 0
+
+        self.__file = open(path, "wb")
+        self.__file.write(FILE_MAGIC)
+        self.__queue = queue.Queue(maxsize=max(int(queue_chunks), 1))
+        self.__writer = threading.Thread(target=self.__write_chunks, name="recorder", daemon=True)
+        self.__writer.start()
+
+    @property
+    def closed(self):
+        return self.__file is None
+
+    def record(self, pos, vel, ids, radius, version, sim_time, steps) -> bool:
+        """
+        Record one frame if at least 'stride' steps passed since the last, returns True if it did
+        - ids and radius are only read when a new chunk starts (ie. when 'version' changes)
+        """
+        if self.closed:
+            return False
+        # (steps going backwards, eg. after a checkpoint restore, starts the stride again)
+        if self.__next_step is not None and self.__next_step - self.stride <= steps < self.__next_step:
+            return False
+        self.__next_step = steps + self.stride
+
+        chunk = self.__chunk
+        if chunk is not None and chunk.version != version:
+            self.__submit()
+            chunk = None
+        if chunk is None:
+            chunk = self.__chunk = _Chunk(version, ids, radius, self.chunk_frames, self.dtype)
+
+        i = chunk.count
+        chunk.data[i, :, :3] = pos
+        chunk.data[i, :, 3:] = vel
+        chunk.times[i] = sim_time
+        chunk.steps[i] = steps
+        chunk.count += 1
+        self.frames += 1
+
+        if chunk.full:
+            self.__submit()
+        return True
+
+    def record_table(self, bodies : BodyTable, sim_time, steps) -> bool:
+        """
+        Record a frame straight from a body table
+        """
+        return self.record(bodies.pos, bodies.vel, bodies.ids, bodies.radius, bodies.version, sim_time, steps)
+
+    def record_snapshot(self, snapshot, bodies : BodyTable) -> bool:
+        """
+        Record a frame from a simulation Snapshot
+        - Everything is read from the snapshot, 'bodies' is not used (kept for callers)
+        """
+        n = snapshot.count
+        return self.record(snapshot.pos[:n], snapshot.vel[:n], snapshot.ids[:n], snapshot.radius[:n], snapshot.version, snapshot.time, snapshot.steps)
+
+    def close(self):
+        """
+        Write the last chunk and close the file
+        """
+        if self.closed:
+            return
+        self.__submit()
+        self.__queue.put(None)
+        self.__writer.join()
+        self.__file.close()
+        self.__file = None
+
+    ###
+    ### Private functions
+    ###
+
+    def __submit(self):
+        chunk = self.__chunk
+        self.__chunk = None
+        if chunk is None or chunk.count == 0:
+            return
+        try:
+            self.__queue.put_nowait(chunk)
+        except queue.Full:
+            self.dropped += chunk.count
+
+    def __write_chunks(self):
+        """
+        Writer thread: encode and append chunks until told to stop
+        """
+        while True:
+            chunk = self.__queue.get()
+            if chunk is None:
+                break
+
+            k = chunk.count
+            data = encode(chunk.data[:k], self.encoding)
+            header = CHUNK_HEADER.pack(CHUNK_MAGIC, ENCODINGS.index(self.encoding), self.dtype.itemsize, k, len(chunk.ids), len(data))
+            for part in (header, chunk.ids.tobytes(), chunk.radius.tobytes(), chunk.times[:k].tobytes(), chunk.steps[:k].tobytes(), data):
+                self.__file.write(part)
+                self.bytes_written += len(part)
+            self.__file.flush()
+
+class TrajectoryReader():
+    """
+    Random access to the frames of a trajectory file
+    - The file is memory-mapped and only the chunk headers are read up front, to build a
+      frame -> (chunk, slot) index, so seeking to any frame is O(1)
+    - Raw chunks are read straight from the map, compressed chunks are decoded when first
+      needed (the last decoded chunk is kept, so playing through a chunk decodes it once)
+    - A chunk cut short at the end of the file (eg. still being written) is ignored
+    """
+    def __init__(self, path):
+        self.path = path
+
+        size = os.path.getsize(path)
+        self.__map = np.memmap(path, dtype=np.uint8, mode="r") if size else np.zeros(0, dtype=np.uint8)
+        if size and bytes(self.__map[:len(FILE_MAGIC)]) != FILE_MAGIC:
+            raise ValueError(f"'{path}' is not a trajectory file")
+
+        chunks = []
+        offset = len(FILE_MAGIC)
+        while offset + CHUNK_HEADER.size <= size:
+            magic, encoding, itemsize, frames, bodies, data_size = CHUNK_HEADER.unpack_from(self.__map, offset)
+            if magic != CHUNK_MAGIC:
+                raise ValueError(f"Corrupt chunk at byte {offset} of '{path}'")
+            start = offset + CHUNK_HEADER.size
+            end = start + 16*bodies + 16*frames + data_size
+            if end > size:
+                break
+            chunks.append((start, ENCODINGS[encoding], np.dtype(np.float32 if itemsize == 4 else np.float64), frames, bodies, data_size))
+            offset = end
+        self.__chunks = chunks
+
+        frames = np.array([c[3] for c in chunks], dtype=np.int64)
+        first = np.cumsum(frames) - frames
+        self.frame_chunk = np.repeat(np.arange(len(chunks)), frames)
+        self.frame_slot = np.arange(frames.sum()) - first[self.frame_chunk]
+
+        # Simulation time and step count of every frame
+        self.times = np.concatenate([self.__times(c) for c in chunks]) if chunks else np.zeros(0)
+        self.steps = np.concatenate([self.__steps(c) for c in chunks]) if chunks else np.zeros(0, dtype=np.int64)
+
+        self.__cached = (None, None)
+
+    def __len__(self):
+        return len(self.frame_chunk)
+
+    @property
+    def duration(self):
+        return float(self.times[-1] - self.times[0]) if len(self) else 0.0
+
+    def frame(self, i):
+        """
+        (pos, vel, ids, radius) arrays of frame i, pos and vel are (bodies, 3)
+        """
+        c = int(self.frame_chunk[i])
+        data = self.__chunk_data(c)
+        slot = self.frame_slot[i]
+        ids, radius = self.__bodies(self.__chunks[c])
+        return data[slot, :, :3], data[slot, :, 3:], ids, radius
+
+    def frame_at(self, sim_time) -> int:
+        """
+        Index of the last frame at or before a simulation time
+        """
+        i = int(np.searchsorted(self.times, sim_time, side="right")) - 1
+        return min(max(i, 0), len(self) - 1)
+
+    def close(self):
+        self.__cached = (None, None)
+        self.__map = np.zeros(0, dtype=np.uint8)
+
+    ###
+    ### Private functions
+    ###
+
+    def __bodies(self, chunk):
+        start, _, _, _, bodies, _ = chunk
+        ids = self.__map[start:start+8*bodies].view(np.int64)
+        radius = self.__map[start+8*bodies:start+16*bodies].view(np.float64)
+        return ids, radius
+
+    def __times(self, chunk):
+        start, _, _, frames, bodies, _ = chunk
+        start += 16*bodies
+        return self.__map[start:start+8*frames].view(np.float64)
+
+    def __steps(self, chunk):
+        start, _, _, frames, bodies, _ = chunk
+        start += 16*bodies + 8*frames
+        return self.__map[start:start+8*frames].view(np.int64)
+
+    def __chunk_data(self, c):
+        if self.__cached[0] == c:
+            return self.__cached[1]
+
+        start, encoding, dtype, frames, bodies, data_size = self.__chunks[c]
+        start += 16*bodies + 16*frames
+        data = decode(self.__map[start:start+data_size], encoding, dtype, frames, bodies)
+        self.__cached = (c, data)
+        return data
@@ -1,25 +1,118 @@
+import os
+import logging
+from functools import lru_cache
+import glm
 from glm import vec2, vec3
+import numpy as np
 import pygame
 
-from constants import BACKGROUND_COLOR, CAM_MOVE_SPEED, CAM_ZOOM_AMOUNT, ZOOM_MIN, ZOOM_MAX, TYPE_ACCEL, TYPE_VEL, SCREEN_WIDTH
+from constants import BACKGROUND_COLOR, CAM_MOVE_SPEED, CAM_ZOOM_AMOUNT, ZOOM_MIN, ZOOM_MAX, TYPE_ACCEL, TYPE_VEL, SCREEN_WIDTH, SCREEN_HEIGHT, PHYSICS_THREADED, PHYSICS_RATE, DELTA_T, GRAVITY_ENGINE, INTEGRATOR, CHECKPOINT_PATH, RECORD_PATH, PLANET_COLOR, LOD_RENDERING, LOD_RADIUS
 # from objects import CelestialObject, SpriteEntity, TransientDrawEntity, TextObject, VelocityArrow
 # from objects import TransientDrawEntity, TextObject, VelocityArrow
 # from objects import TextObject
 from usercontrol import UserControlGroup, Label, ToggleButton
 from celestial_scene_gui import CelestialSceneGui
-from transient_entity import TransientEntity, IndicatorArrow
+from transient_entity import TransientEntity, ArrowLayer
 from celestial_entity import CelestialEntity, PlanetEntity
 from containers import CelestialSpriteGroup
+from simulation import Simulation, PhysicsThread
+from gravity import ENGINES
+from integrators import INTEGRATORS
+from collisions import CollisionStage
+from checkpoint import save_checkpoint, restore_checkpoint
+from recorder import TrajectoryRecorder, TrajectoryReader
+from logger import get_logger
+
+log = get_logger(__name__)
+
+@lru_cache(maxsize=None)
+def _disc_offsets(r):
+    """
+    (dx, dy) pixel offsets covered by a filled circle of radius r pixels
+    """
+    return [(dx, dy) for dx in range(-r, r+1) for dy in range(-r, r+1) if dx*dx + dy*dy <= r*r]
 
 class Camera():
+    """
+    Camera Class
+    - position x, y is the screen offset of the world, z the zoom (see zoom), rotation is in degrees
+    - Owns the view matrix every body is projected with, rebuilt only when the camera changed
+    """
     def __init__(self):
         self.fov = 90
         self.position = vec3(0)
         self.rotation = vec3(0)
 
+        # View matrix and the (position, rotation) it was built for (see view)
+        self.__view = None
+        self.__view_key = None
+
     def shift(self, v : vec3):
         self.position += v
 
+    @property
+    def zoom(self):
+        """
+        Zoom factor, 1 at z = 0 (z runs from ZOOM_MIN to ZOOM_MAX)
+        """
+        return (self.position.z + 100)/100
+
+    @property
+    def view(self) -> np.ndarray:
+        """
+        (2, 4) matrix taking world positions (x, y, z, 1) to screen positions (x, y)
+        - Rotation, then the position offset, then the zoom about the centre of the screen
+        - The same array is returned until the camera's position or rotation change
+        """
+        key = (tuple(self.position), tuple(self.rotation))
+        if key != self.__view_key:
+            self.__view = self.__build_view()
+            self.__view_key = key
+        return self.__view
+
+    def __build_view(self):
+        rot = self.rotation
+        M = glm.rotate(glm.mat4(1), glm.radians(rot.x), vec3(1, 0, 0))
+        M = glm.rotate(M, glm.radians(rot.y), vec3(0, 1, 0))
+        M = glm.rotate(M, glm.radians(rot.z), vec3(0, 0, 1))
+
+        zoom = self.zoom
+        centre = np.array((SCREEN_WIDTH/2, SCREEN_HEIGHT/2))
+        offset = np.array((self.position.x, self.position.y))
+        view = np.empty((2, 4))
+        view[:, :3] = zoom*np.array(M)[:2, :3]
+        view[:, 3] = centre + zoom*(offset - centre)
+        view.setflags(write=False)
+        return view
+
+    def transform(self, pos) -> np.ndarray:
+        """
+        (N, 2) float screen positions of an (N, 3) array of world positions
+        """
+        view = self.view
+        return np.asarray(pos, dtype=np.float64) @ view[:, :3].T + view[:, 3]
+
+    def project(self, pos):
+        """
+        Screen x, y (int arrays) of an (N, 3) array of world positions
+        """
+        p = self.transform(pos)
+        return p[:, 0].astype(np.int64), p[:, 1].astype(np.int64)
+
+    def directions(self, vec) -> np.ndarray:
+        """
+        (N, 2) screen space lengths of an (N, 3) array of world vectors (rotated and zoomed, not offset)
+        """
+        return np.asarray(vec, dtype=np.float64) @ self.view[:, :3].T
+
+    def unproject(self, x, y):
+        """
+        World x, y of a screen position (ignores the rotation)
+        """
+        cx, cy = SCREEN_WIDTH/2, SCREEN_HEIGHT/2
+        zoom = self.zoom
+        return (x - cx)/zoom + cx - self.position.x, (y - cy)/zoom + cy - self.position.y
+
 class Scene():
     def __init__(self, app):
         self.app = app
@@ -28,6 +121,16 @@ class Scene():
         self.content = pygame.sprite.RenderUpdates()
         self.camera = Camera()
 
+        # Screen area that is drawn, and the sprites of content inside it (None draws all content)
+        self.viewport = pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.visible_sprites = None
+
+        # Level of detail: bodies under LOD_RADIUS screen pixels are plotted, not blitted
+        self.lod = LOD_RENDERING
+
+        # Camera view matrix drawn with last frame, the whole screen is pushed when it changes
+        self.__view = None
+
     def move_cam_left(self):
         self.camera.shift(vec3(CAM_MOVE_SPEED, 0, 0))
 
@@ -44,13 +147,13 @@ class Scene():
         if (self.camera.position.z > ZOOM_MIN):
             self.camera.shift(vec3(0, 0, -CAM_ZOOM_AMOUNT))
         else:
-            print("Can't zoom out further")
+            log.info("Can't zoom out further")
 
     def move_cam_in(self):
         if (self.camera.position.z < ZOOM_MAX):
             self.camera.shift(vec3(0, 0, CAM_ZOOM_AMOUNT))
         else:
-            print("Can't zoom in further")
+            log.info("Can't zoom in further")
 
     def camera_front(self):
         self.camera.position.x = 100
@@ -62,26 +165,127 @@ class Scene():
         self.camera.position = vec3(0)
         self.camera.rotation = vec3(0)
 
+    def project(self, pos):
+        """
+        Screen x, y (int arrays) of an (N, 3) array of world positions, with the camera's view
+        """
+        return self.camera.project(pos)
+
+    def in_view(self, left, top, right, bottom):
+        """
+        Mask of the screen space boxes (arrays of edges) that overlap the viewport
+        """
+        v = self.viewport
+        return (right >= v.left) & (left < v.right) & (bottom >= v.top) & (top < v.bottom)
+
+    def toggle_lod(self):
+        self.lod = not self.lod
+        log.info("Level of detail rendering: %s", "on" if self.lod else "off")
+
+    def lod_mask(self, screen_radius):
+        """
+        Mask of the bodies small enough on screen to be plotted as pixels
+        """
+        if not self.lod:
+            return np.zeros(len(screen_radius), dtype=bool)
+        return screen_radius < LOD_RADIUS
+
+    def plot(self, surface : pygame.Surface, x, y, screen_radius, color):
+        """
+        Draw small filled circles straight into the surface's pixels, in bulk
+        - screen_radius is rounded to whole pixels, 0 plots a single pixel
+        """
+        if len(x) == 0:
+            return
+        w, h = surface.get_size()
+        value = surface.map_rgb(color)
+        radius = np.rint(screen_radius).astype(np.int64)
+        self.app.dirty.add_boxes(x - radius, y - radius, 2*radius + 1, 2*radius + 1)
+
+        pixels = pygame.surfarray.pixels2d(surface)
+        try:
+            for r in np.unique(radius).tolist():
+                sel = radius == r
+                bx = x[sel]
+                by = y[sel]
+                # One scattered write per offset, cheaper than one over all offsets at once
+                for dx, dy in _disc_offsets(r):
+                    px = bx + dx
+                    py = by + dy
+                    inside = (px >= 0) & (px < w) & (py >= 0) & (py < h)
+                    pixels[px[inside], py[inside]] = value
+        finally:
+            # Unlocks the surface
+            del pixels
+
     def update(self, delta_time):
         # Update all sprites in the scene.content
         self.content.update(delta_time)
 
     def draw(self, surface : pygame.Surface):
-        # Draw all sprites in scene.content
-        surface.fill(self.bg_color)
+        dirty = self.app.dirty
+
+        # Everything on screen moves with the camera, so push the whole screen when it does
+        view = self.camera.view
+        if view is not self.__view:
+            self.__view = view
+            dirty.invalidate()
 
-        dirty_rects = self.content.draw(surface)  # TODO: handle dirty rects back up to App.draw()
+        # Erase what was drawn last frame
+        dirty.clear(surface, self.bg_color)
+
+        # Draw all sprites in scene.content
+        if self.visible_sprites is None:
+            dirty.extend(self.content.draw(surface))
+        else:
+            dirty.extend(surface.blits([(s.image, s.rect) for s in self.visible_sprites]))
 
 class CelestialScene(Scene):
     """
     Celestial Scene Class
     - Handles graphical elements
+    - kwargs 'engine' and 'integrator' pick the scene's gravity engine and integrator by name
+    - Only bodies and arrows inside the viewport are drawn
     """
-    def __init__(self, app):
+    # Extra pixels around an arrow's line for its head
+    ARROW_MARGIN = 10
+
+    def __init__(self, app, **kwargs):
         super().__init__(app)
 
         self.celest_objs = CelestialSpriteGroup()
         self.transient_objs = []
+
+        # Velocity and acceleration arrows of every body with a sprite, computed and drawn in bulk
+        self.arrows = ArrowLayer({TYPE_ACCEL: (200,0,0), TYPE_VEL: (0,70,170)})
+
+        # Steps the physics of all bodies in celest_objs, optionally on its own thread
+        engine = kwargs.pop("engine", GRAVITY_ENGINE)
+        integrator = kwargs.pop("integrator", INTEGRATOR)
+        self.simulation = Simulation(self.celest_objs.bodies, engine=engine, integrator=integrator)
+        self.physics_thread = None
+        if PHYSICS_THREADED:
+            self.physics_thread = PhysicsThread(self.simulation)
+            self.physics_thread.start()
+        self.__paused = False
+
+        # Streams body states to disk while set (see toggle_recording())
+        self.recorder = None
+
+        # Mask of the snapshot rows with a sprite, the others (eg. restored from a checkpoint)
+        # are drawn as plain circles without arrows
+        self.__owned = np.zeros(0, dtype=bool)
+        self.__owned_version = -1
+        self.__snapshot = None
+
+        # Per row masks of the bodies blitted/drawn and the indicator arrows on screen, and the
+        # rows plotted as pixels (see __cull())
+        self.__visible = None
+        self.__arrows_visible = None
+        self.__plotted = np.zeros(0, dtype=np.int64)
+
+        # (view matrix, screen positions, screen radii) of the pinned snapshot (see __project())
+        self.__screen = None
         
         self.controls = UserControlGroup()
         self.gui = CelestialSceneGui(self.controls)
@@ -95,16 +299,13 @@ class CelestialScene(Scene):
         self.bg_color = BACKGROUND_COLOR
 
         for c in self.controls:
-            print(f"Control of type: {type(c)}")
+            log.debug("Control of type: %s", type(c))
 
     def add_new_celestial(self, new_celestial):
-        # New celestial instance with world_offset
+        # New celestial instance at the world position under its screen position
         ctr = new_celestial.rect.center
-        world_ctr = (ctr[0] + int(-self.camera.position.x), ctr[1] + int(-self.camera.position.y))
-        new_celestial.position = world_ctr
-        
-        # Set the group to the celestial
-        new_celestial.neighbours = self.celest_objs
+        x, y = self.camera.unproject(*ctr)
+        new_celestial.pos = (x, y, 0)
 
         # Add to sprite.Group() for processing
         self.celest_objs.add(new_celestial)
@@ -112,14 +313,70 @@ class CelestialScene(Scene):
         # Add to scene sprite.Group() for drawing
         self.content.add(new_celestial)
 
-        # Add vector arrows to for celestial
-        arr_accel = IndicatorArrow(new_celestial.position, new_celestial, color=(200,0,0), indicator_type=TYPE_ACCEL, thickness=1)
-        arr_vel = IndicatorArrow(new_celestial.position, new_celestial, color=(0,70,170), indicator_type=TYPE_VEL, thickness=1)
+        # Its vector arrows are drawn by the scene's ArrowLayer from the body's table row
+        return new_celestial
 
-        self.transient_objs.append(arr_accel)
-        self.transient_objs.append(arr_vel)
+    @property
+    def paused(self):
+        return self.__paused
 
-        return new_celestial
+    @paused.setter
+    def paused(self, p):
+        """
+        Pause/resume the physics (update() is not called while a state is paused, but
+        a physics thread keeps running unless told)
+        """
+        if self.physics_thread:
+            self.physics_thread.paused = p
+        elif self.__paused and not p:
+            self.simulation.reset_clock()
+        self.__paused = p
+
+    def close(self):
+        """
+        Stop the physics thread and release the gravity engine
+        """
+        if self.physics_thread:
+            self.physics_thread.stop()
+            self.physics_thread = None
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+        self.simulation.close()
+
+    def cycle_gravity_engine(self):
+        """
+        Switch the simulation to the next registered gravity engine
+        """
+        names = list(ENGINES)
+        current = names.index(self.simulation.engine.name)
+        self.simulation.engine = names[(current + 1) % len(names)]
+        log.info("Gravity engine: %s", self.simulation.engine.name)
+
+    def toggle_collisions(self):
+        """
+        Turn merging of colliding bodies on/off
+        """
+        with self.celest_objs.bodies.lock:
+            self.simulation.collisions = None if self.simulation.collisions else CollisionStage()
+        log.info("Collisions: %s", "on" if self.simulation.collisions else "off")
+
+    def cycle_integrator(self):
+        """
+        Switch the simulation to the next registered integrator
+        """
+        names = list(INTEGRATORS)
+        current = names.index(self.simulation.integrator.name)
+        self.simulation.integrator = names[(current + 1) % len(names)]
+        log.info("Integrator: %s", self.simulation.integrator.name)
+
+    def toggle_velocity_arrows(self):
+        self.arrows.toggle(TYPE_VEL)
+        log.info("Velocity arrows: %s", "on" if self.arrows.shown[TYPE_VEL] else "off")
+
+    def toggle_acceleration_arrows(self):
+        self.arrows.toggle(TYPE_ACCEL)
+        log.info("Acceleration arrows: %s", "on" if self.arrows.shown[TYPE_ACCEL] else "off")
 
     def kill_all_objects(self):
         """
@@ -129,64 +386,246 @@ class CelestialScene(Scene):
         for o in self.celest_objs:
             o.kill()
         
+        # Drop bodies that have no sprite
+        with self.celest_objs.bodies.lock:
+            self.celest_objs.bodies.clear()
+
         # Clear all transients
         self.transient_objs.clear()
 
-        print(f"Killed all objects: Celestials: {len(self.celest_objs)}, Transients: {len(self.transient_objs)}")
+        log.info("Killed all objects: Celestials: %d, Transients: %d", len(self.celest_objs), len(self.transient_objs))
 
-    def update(self, delta_time):
+    def save_checkpoint(self, path = CHECKPOINT_PATH):
         """
-        Update Scene
+        Write every body and the camera to a checkpoint file
         """
-        super().update(delta_time)
-
-        # Update Camera Position Label UserControl
-        cam_text = f"X: {self.camera.position.x}, Y: {self.camera.position.y}, Z: {self.camera.position.z}"
-        self.__camera_pos_disp.text = cam_text
-
-        # Call update() method of all sprites in the sprite.Group()
-        self.celest_objs.update(delta_time)
+        header = save_checkpoint(path, self.simulation,
+                                 camera_position=list(self.camera.position),
+                                 camera_rotation=list(self.camera.rotation))
+        log.info("Saved checkpoint of %d bodies to %s", header["count"], path)
 
-        # Call update() method of all user controls in the 'controls' group
-        self.controls.update(delta_time)
-        for c in self.controls:
-            if isinstance(c, ToggleButton):
-                print(f"Updating control of type: {type(c)}")
+    def restore_checkpoint(self, path = CHECKPOINT_PATH):
+        """
+        Replace the scene's bodies with a checkpoint's
+        - Bodies are restored in bulk as table rows without sprites, so even very large
+          checkpoints load quickly
+        """
+        if not os.path.exists(path):
+            log.warning("No checkpoint at %s", path)
+            return
 
-        # Iterate sprite group
         for o in self.celest_objs:
-            # Update world offset for all items
-            if isinstance(o, CelestialEntity):
-                o.world_offset = self.camera.position
-                o.world_rotation = self.camera.rotation
+            o.kill()
+        self.transient_objs.clear()
 
-                # Reset 'just_calcd' variable for next frame
-                o.force_just_calcd = False
+        header = restore_checkpoint(path, self.simulation)
+        self.celest_objs.next_id = header.get("next_id", len(self.celest_objs.bodies) + 1)
+        if "camera_position" in header:
+            self.camera.position = vec3(*header["camera_position"])
+        if "camera_rotation" in header:
+            self.camera.rotation = vec3(*header["camera_rotation"])
+        self.simulation.reset_clock()
+        log.info("Restored checkpoint of %d bodies from %s", len(self.celest_objs.bodies), path)
 
-        # Iterate transient non-sprite graphical objects list (in reverse to protect when removing)
-        for t in reversed(self.transient_objs):
-            # Update world offset, call update() and remove expired Transients
-            if isinstance(t, TransientEntity):
-                t.world_offset = self.camera.position
-                t.update(delta_time)
-                if t.dead:
-                    self.transient_objs.remove(t)
+    def toggle_recording(self, path = RECORD_PATH):
+        """
+        Start/stop streaming the body states to a trajectory file
+        """
+        if self.recorder:
+            self.recorder.close()
+            r = self.recorder
+            self.recorder = None
+            log.info("Stopped recording: %d frames (%d dropped), %d bytes written to %s", r.frames, r.dropped, r.bytes_written, r.path)
+        else:
+            self.recorder = TrajectoryRecorder(path)
+            log.info("Recording to %s", path)
+
+    def update(self, delta_time):
+        """
+        Update Scene
+        """
+        profiler = self.app.profiler
+
+        with profiler.phase("physics"):
+            # Advance the physics of every body in fixed steps (unless a physics thread is doing it)
+            if not self.physics_thread:
+                self.simulation.advance(delta_time/1000)
+
+            # Remove the sprites of bodies merged into others and resize the survivors
+            while self.simulation.merges:
+                survivor, absorbed = self.simulation.merges.popleft()
+                for o in absorbed:
+                    if o is not None:
+                        o.kill()
+                if isinstance(survivor, CelestialEntity):
+                    survivor.redraw()
+
+            # Pin the latest physics snapshot for this frame, re-publishing if bodies were added/removed
+            snapshot = self.simulation.snapshots.acquire()
+            if snapshot.version != self.celest_objs.bodies.version:
+                self.simulation.snapshots.release()
+                self.simulation.publish()
+                snapshot = self.simulation.snapshots.acquire()
+            self.__snapshot = snapshot
+
+        with profiler.phase("camera"):
+            # Screen positions of all bodies at once with the camera's view matrix, the sprites
+            # on screen are moved there when culling (see __cull())
+            self.__project()
+
+            # Call update() method of all sprites in scene.content
+            super().update(delta_time)
+
+        with profiler.phase("gui"):
+            # Update Camera Position Label UserControl
+            cam_text = f"X: {self.camera.position.x}, Y: {self.camera.position.y}, Z: {self.camera.position.z}"
+            self.__camera_pos_disp.text = cam_text
+
+            # Call update() method of all user controls in the 'controls' group
+            self.controls.update(delta_time)
+            if log.isEnabledFor(logging.DEBUG):
+                for c in self.controls:
+                    if isinstance(c, ToggleButton):
+                        log.debug("Updating control of type: %s", type(c))
+
+        with profiler.phase("transients"):
+            # Iterate transient non-sprite graphical objects list (in reverse to protect when removing)
+            for t in reversed(self.transient_objs):
+                # Update world offset, call update() and remove expired Transients
+                if isinstance(t, TransientEntity):
+                    t.world_offset = self.camera.position
+                    t.update(delta_time)
+                    if t.dead:
+                        self.transient_objs.remove(t)
+
+        # Copy this frame's body states to the recorder (it writes them out on its own thread)
+        if self.recorder:
+            self.recorder.record_snapshot(self.__snapshot, self.celest_objs.bodies)
 
     def draw(self, surface : pygame.Surface):
         """
         Draw function
         - Handles drawing any objects that are not automatically drawn through sprite.Group()s
         """
+        self.__cull()
+
         # Call super() draw() function to draw scene.content
         super().draw(surface)
 
+        self.__draw_ownerless(surface)
+
+        if len(self.__plotted):
+            self.plot(surface, *self.__plot_xy, self.__screen[2][self.__plotted], PLANET_COLOR)
+
+        # Arrows of the bodies on screen, all at once
+        dirty = self.app.dirty
+        if self.__arrows_visible is not None:
+            dirty.extend(self.arrows.draw(surface, np.flatnonzero(self.__arrows_visible)))
+
         # Iterate all Transient objects and call .draw() func
         for t in self.transient_objs:
             if isinstance(t, TransientEntity):
-                t.draw(surface)
+                dirty.add(t.draw(surface))
 
         # Draw all controls in the 'controls' group
-        self.controls.draw(surface)
+        dirty.extend(self.controls.draw(surface))
+
+    def __cull(self):
+        """
+        Private function to find the bodies and arrows on screen, in bulk from the pinned snapshot
+        - Sets visible_sprites, and the row masks used for the ownerless bodies and the arrows
+        - Reads only the snapshot, never the live table the physics thread may be changing
+        - Without a snapshot everything is drawn
+        """
+        snapshot = self.__snapshot
+        if snapshot is None:
+            self.visible_sprites = None
+            self.__visible = None
+            self.__arrows_visible = None
+            self.__plotted = np.zeros(0, dtype=np.int64)
+            return
+
+        # Projected in update() unless the camera moved since
+        if self.__screen is None or self.__screen[0] is not self.camera.view:
+            self.__project()
+        _, screen, screen_radius = self.__screen
+        x = screen[:, 0].astype(np.int64)
+        y = screen[:, 1].astype(np.int64)
+        r = screen_radius + 1
+        visible = self.in_view(x - r, y - r, x + r, y + r)
+
+        # Bodies that are only a few pixels across are plotted, the rest keep their sprites
+        small = visible & self.lod_mask(screen_radius)
+        self.__plotted = np.flatnonzero(small)
+        self.__plot_xy = (x[small], y[small])
+        self.__visible = visible & ~small
+
+        # Arrows run from the body's screen position, only bodies with a sprite have them and
+        # none are drawn when zoomed out too far
+        zoom = self.camera.zoom
+        if self.arrows.visible(zoom):
+            n = snapshot.count
+            self.arrows.update(screen, self.camera.directions(snapshot.vel[:n]), self.camera.directions(snapshot.acc[:n]))
+            self.__arrows_visible = self.in_view(*self.arrows.bounds(self.ARROW_MARGIN)) & self.__owned_mask()
+        else:
+            self.__arrows_visible = None
+
+        # Move the sprites on screen to their bodies' screen positions (skipping any merged away
+        # since the snapshot was taken)
+        owners = snapshot.owners
+        rows = np.flatnonzero(self.__visible)
+        sprites = []
+        for i, cx, cy in zip(rows.tolist(), x[rows].tolist(), y[rows].tolist()):
+            o = owners[i]
+            if o is not None and o.alive():
+                o.place((cx, cy), zoom)
+                sprites.append(o)
+        self.visible_sprites = sprites
+
+    def __project(self):
+        """
+        Private function to project the pinned snapshot's positions and radii to the screen
+        - Sets __screen to (view matrix, (N, 2) screen positions, screen radii)
+        """
+        snapshot = self.__snapshot
+        if snapshot is None:
+            self.__screen = None
+            return
+        n = snapshot.count
+        self.__screen = (self.camera.view, self.camera.transform(snapshot.pos[:n]), snapshot.radius[:n]*self.camera.zoom)
+
+    def __draw_ownerless(self, surface : pygame.Surface):
+        """
+        Private function to draw the bodies that have no sprite, from the pinned snapshot
+        """
+        snapshot = self.__snapshot
+        if snapshot is None:
+            return
+
+        rows = np.flatnonzero(~self.__owned_mask())
+        if self.__visible is not None:
+            rows = rows[self.__visible[rows]]
+        if len(rows) == 0:
+            return
+
+        x, y = self.project(snapshot.pos[rows])
+        radius = np.maximum(snapshot.radius[rows]*self.camera.zoom, 1).astype(np.int64)
+
+        dirty = self.app.dirty
+        for cx, cy, r in zip(x.tolist(), y.tolist(), radius.tolist()):
+            dirty.add(pygame.draw.circle(surface, PLANET_COLOR, (cx, cy), r))
+
+    def __owned_mask(self):
+        """
+        Private function for the mask of the pinned snapshot's rows that have a sprite
+        - Which rows are owned only changes with the table version
+        """
+        snapshot = self.__snapshot
+        if self.__owned_version != snapshot.version:
+            owners = snapshot.owners
+            self.__owned = np.fromiter((o is not None for o in owners), dtype=bool, count=len(owners))
+            self.__owned_version = snapshot.version
+        return self.__owned
 
     def __create_gui_controls(self):
         play_pause_img = pygame.Surface(50, 50)
@@ -196,3 +635,132 @@ class CelestialScene(Scene):
         select_celestial_btn = None
         move_camera_btn = None
         rotate_camera_btn = None
+
+class ReplayScene(Scene):
+    """
+    Replay Scene Class
+    - Plays back a recorded trajectory (see recorder.TrajectoryReader), no physics is run
+    - Playback runs in simulation time, 'speed' times as fast as the live simulation
+    - Any frame can be jumped to directly, frames in between are never computed
+    """
+    TIMELINE_MARGIN = 20
+    TIMELINE_HEIGHT = 8
+
+    def __init__(self, app, path = RECORD_PATH):
+        super().__init__(app)
+
+        self.bg_color = BACKGROUND_COLOR
+
+        self.reader = TrajectoryReader(path)
+        self.playing = True
+        self.speed = 1.0
+        self.frame = 0
+        self.__time = float(self.reader.times[0]) if len(self.reader) else 0.0
+
+        self.controls = UserControlGroup()
+        self.__status = Label(self.controls, "replay_status_label", text = 'Frame 0000000/0000000, T: 00000000.0, Speed: x000.00 (paused)', font = self.app.font)
+        self.__status.x = 5
+        self.__status.y = 5
+
+        self.timeline = pygame.Rect(self.TIMELINE_MARGIN, SCREEN_HEIGHT - 2*self.TIMELINE_MARGIN,
+                                    SCREEN_WIDTH - 2*self.TIMELINE_MARGIN, self.TIMELINE_HEIGHT)
+
+        log.info("Replaying %d frames (%.1f simulation seconds) from %s", len(self.reader), self.reader.duration, path)
+
+    def close(self):
+        self.reader.close()
+
+    def toggle_play(self):
+        # Restart from the beginning if playing from the last frame
+        if not self.playing and self.frame >= len(self.reader) - 1:
+            self.seek(0)
+        self.playing = not self.playing
+
+    def seek(self, frame):
+        """
+        Jump to a frame
+        """
+        if len(self.reader) == 0:
+            return
+        self.frame = min(max(int(frame), 0), len(self.reader) - 1)
+        self.__time = float(self.reader.times[self.frame])
+
+    def seek_fraction(self, f):
+        """
+        Jump to a point of the recording, 0 is the start and 1 the end
+        """
+        self.seek(round(f*(len(self.reader) - 1)))
+
+    def seek_start(self):
+        self.seek(0)
+
+    def seek_end(self):
+        self.seek(len(self.reader) - 1)
+
+    def step_forward(self):
+        self.seek(self.frame + 1)
+
+    def step_back(self):
+        self.seek(self.frame - 1)
+
+    def faster(self):
+        self.speed = min(self.speed*2, 1024)
+
+    def slower(self):
+        self.speed = max(self.speed/2, 1/64)
+
+    def scrub(self):
+        """
+        Seek to the frame under the mouse if it is on the timeline
+        """
+        x, y = pygame.mouse.get_pos()
+        band = self.timeline.inflate(0, 4*self.TIMELINE_HEIGHT)
+        if band.collidepoint(x, y):
+            self.seek_fraction((x - self.timeline.x)/max(self.timeline.width, 1))
+
+    def update(self, delta_time):
+        """
+        Update Scene
+        """
+        n = len(self.reader)
+        if self.playing and n:
+            self.__time += delta_time/1000*PHYSICS_RATE*DELTA_T*self.speed
+            self.frame = self.reader.frame_at(self.__time)
+            if self.frame == n - 1:
+                self.playing = False
+
+        state = "playing" if self.playing else "paused"
+        self.__status.text = f"Frame {self.frame+1}/{n}, T: {self.__time:.1f}, Speed: x{self.speed:g} ({state})"
+
+        self.controls.update(delta_time)
+
+    def draw(self, surface : pygame.Surface):
+        """
+        Draw function
+        """
+        super().draw(surface)
+        dirty = self.app.dirty
+
+        if len(self.reader):
+            pos, vel, ids, radius = self.reader.frame(self.frame)
+            x, y = self.project(pos)
+            radius = radius*self.camera.zoom
+            r = np.maximum(radius, 1)
+            visible = self.in_view(x - r, y - r, x + r, y + r)
+
+            # Tiny bodies as pixels, the rest as circles
+            small = visible & self.lod_mask(radius)
+            self.plot(surface, x[small], y[small], radius[small], PLANET_COLOR)
+            large = visible & ~small
+            x, y, r = x[large], y[large], r[large].astype(np.int64)
+            for cx, cy, r in zip(x.tolist(), y.tolist(), r.tolist()):
+                dirty.add(pygame.draw.circle(surface, PLANET_COLOR, (cx, cy), r))
+
+        # Timeline with the current position
+        dirty.add(pygame.draw.rect(surface, (90, 90, 90), self.timeline))
+        if len(self.reader) > 1:
+            done = self.timeline.copy()
+            done.width = round(self.timeline.width*self.frame/(len(self.reader) - 1))
+            pygame.draw.rect(surface, (200, 200, 200), done)
+
+        dirty.extend(self.controls.draw(surface))
@@ -0,0 +1,278 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+
+from body_table import BodyTable
+from constants import DELTA_T, GRAVITY_ENGINE, INTEGRATOR, PHYSICS_RATE, PHYSICS_MAX_STEPS, BLOCK_TIMESTEPS, COLLISIONS
+from gravity import GravityEngine, make_engine
+from integrators import Integrator, make_integrator
+from timesteps import BlockTimesteps
+from collisions import CollisionStage
+
+class Snapshot():
+    """
+    Copy of the body state at one point in simulation time, for the renderer
+    - Rows match the BodyTable rows of the same 'version'
+    - Radii, ids and owners are copied too, so the renderer never has to read the live table
+      (which the physics thread may merge or remove rows from at any time)
+    """
+    def __init__(self):
+        self.pos = np.zeros((0, 3))
+        self.vel = np.zeros((0, 3))
+        self.acc = np.zeros((0, 3))
+        self.radius = np.zeros(0)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.owners = []
+        self.count = 0
+        self.version = -1
+        self.time = 0.0
+        self.steps = 0
+
+class SnapshotBuffer():
+    """
+    Double-buffered Snapshots
+    - The physics side publishes into the back buffer and swaps it to the front
+    - The render side pins the front buffer with acquire(), publishing skips while the
+      back buffer is still pinned so a snapshot never changes while it is being drawn
+    """
+    def __init__(self):
+        self.__buffers = [Snapshot(), Snapshot()]
+        self.__front = 0
+        self.__pinned = None
+        self.__lock = threading.Lock()
+
+    @property
+    def front(self) -> Snapshot:
+        return self.__buffers[self.__front]
+
+    def acquire(self) -> Snapshot:
+        """
+        Pin and return the front snapshot (releases any previously pinned one)
+        """
+        with self.__lock:
+            self.__pinned = self.__front
+            return self.__buffers[self.__front]
+
+    def release(self):
+        with self.__lock:
+            self.__pinned = None
+
+    def publish(self, bodies : BodyTable, sim_time, steps) -> bool:
+        """
+        Copy the current body state into the back buffer and make it the front
+        - Returns False if the back buffer is pinned by the reader
+        """
+        with self.__lock:
+            back = 1 - self.__front
+            if back == self.__pinned:
+                return False
+
+        snap = self.__buffers[back]
+        n = len(bodies)
+        if len(snap.pos) < n:
+            size = max(n, 2*len(snap.pos))
+            snap.pos = np.zeros((size, 3))
+            snap.vel = np.zeros((size, 3))
+            snap.acc = np.zeros((size, 3))
+            snap.radius = np.zeros(size)
+            snap.ids = np.zeros(size, dtype=bodies.ids.dtype)
+        snap.pos[:n] = bodies.pos
+        snap.vel[:n] = bodies.vel
+        snap.acc[:n] = bodies.acc
+        snap.radius[:n] = bodies.radius
+        snap.ids[:n] = bodies.ids
+        snap.owners = bodies.owners[:n]
+        snap.count = n
+        snap.version = bodies.version
+        snap.time = sim_time
+        snap.steps = steps
+
+        with self.__lock:
+            self.__front = back
+        return True
+
+class Simulation():
+    """
+    Advances every body in a BodyTable through time
+    - Forces for all bodies are computed in one call to the gravity engine per evaluation
+    - The integrator (see integrators.INTEGRATORS) decides how many evaluations a step takes
+    - With block_timesteps set, each step is split into per-body power-of-two sub-steps
+      instead (see timesteps.BlockTimesteps, which integrates with leapfrog)
+    - With collisions set, overlapping bodies are merged after each step. The merges are
+      queued on 'merges' as (survivor owner, [absorbed owners]) for the owner of the table
+      (eg. the scene) to update its sprites on its own thread
+    - advance() runs fixed 'dt' steps at PHYSICS_RATE steps per real second, independent of FPS
+    - Every advance publishes the new state to 'snapshots' for the renderer
+    """
+    def __init__(self, bodies : BodyTable, engine = GRAVITY_ENGINE, dt = DELTA_T, rate = PHYSICS_RATE, integrator = INTEGRATOR, block_timesteps = BLOCK_TIMESTEPS, collisions = COLLISIONS):
+        self.bodies = bodies
+        self.dt = dt
+        self.rate = rate
+        self.max_steps = PHYSICS_MAX_STEPS
+
+        self.time = 0.0
+        self.steps = 0
+
+        self.snapshots = SnapshotBuffer()
+        self.__accumulator = 0.0
+
+        self.__engine = None
+        self.engine = engine
+
+        # Table version the stored accelerations were computed for
+        self.__acc_version = -1
+        self.__integrator = None
+        self.integrator = integrator
+
+        self.block_timesteps = None
+        if block_timesteps:
+            self.block_timesteps = block_timesteps if isinstance(block_timesteps, BlockTimesteps) else BlockTimesteps()
+
+        self.collisions = None
+        if collisions:
+            self.collisions = collisions if isinstance(collisions, CollisionStage) else CollisionStage()
+        self.merges = deque()
+
+    @property
+    def engine(self) -> GravityEngine:
+        return self.__engine
+
+    @engine.setter
+    def engine(self, engine):
+        """
+        Set the gravity engine from an instance or a registered name
+        """
+        if isinstance(engine, str):
+            engine = make_engine(engine)
+        with self.bodies.lock:
+            if self.__engine is not None and self.__engine is not engine:
+                self.__engine.close()
+            self.__engine = engine
+            # The forces of the last step came from the old engine
+            self.__acc_version = -1
+
+    @property
+    def integrator(self) -> Integrator:
+        return self.__integrator
+
+    @integrator.setter
+    def integrator(self, integrator):
+        """
+        Set the integrator from an instance or a registered name
+        """
+        if isinstance(integrator, str):
+            integrator = make_integrator(integrator)
+        with self.bodies.lock:
+            self.__integrator = integrator
+            # acc holds whatever the old scheme evaluated last, not the forces at pos
+            self.__acc_version = -1
+
+    def accelerations(self, pos, targets = None):
+        """
+        Acceleration of the (target) bodies at the given positions
+        """
+        return self.__engine.accelerations(pos, self.bodies.mass, targets)
+
+    def step(self, dt = None):
+        """
+        Advance the simulation by one step
+        """
+        dt = self.dt if dt is None else dt
+        with self.bodies.lock:
+            b = self.bodies
+            if self.block_timesteps:
+                self.block_timesteps.step(self, dt)
+            elif len(b):
+                # Schemes that start from the previous step's forces need them refreshed when bodies change
+                if self.__integrator.uses_acc and self.__acc_version != b.version:
+                    b.acc[:] = self.accelerations(b.pos)
+
+                self.__integrator.step(b.pos, b.vel, b.acc, self.accelerations, dt)
+                self.__acc_version = b.version
+
+            if self.collisions and len(b) > 1:
+                self.merges.extend(self.collisions.resolve(b))
+
+            self.time += dt
+            self.steps += 1
+
+    def advance(self, elapsed) -> int:
+        """
+        Run the fixed steps that are due after 'elapsed' real seconds, returns how many ran
+        - At most max_steps run per call, any further backlog is dropped so a slow step
+          can't snowball into ever longer catch ups
+        """
+        interval = 1/self.rate
+        self.__accumulator += elapsed
+        steps = 0
+        while self.__accumulator >= interval and steps < self.max_steps:
+            self.step()
+            self.__accumulator -= interval
+            steps += 1
+        if steps == self.max_steps:
+            self.__accumulator = min(self.__accumulator, interval)
+
+        if steps:
+            self.publish()
+        return steps
+
+    def time_to_next_step(self) -> float:
+        """
+        Real seconds until advance() will have a step to run
+        """
+        return max(0.0, 1/self.rate - self.__accumulator)
+
+    def reset_clock(self):
+        """
+        Forget accumulated real time (eg. after a pause)
+        """
+        self.__accumulator = 0.0
+
+    def publish(self) -> bool:
+        with self.bodies.lock:
+            return self.snapshots.publish(self.bodies, self.time, self.steps)
+
+    def close(self):
+        self.__engine.close()
+
+class PhysicsThread(threading.Thread):
+    """
+    Worker thread that keeps a Simulation advancing in real time
+    - Runs fixed steps through Simulation.advance() so the rate does not depend on rendering
+    - The render thread reads the results from simulation.snapshots
+    """
+    def __init__(self, simulation : Simulation):
+        super().__init__(name="physics", daemon=True)
+        self.simulation = simulation
+
+        self.__paused = threading.Event()
+        self.__stopped = threading.Event()
+
+    @property
+    def paused(self):
+        return self.__paused.is_set()
+
+    @paused.setter
+    def paused(self, p):
+        if p:
+            self.__paused.set()
+        else:
+            self.simulation.reset_clock()
+            self.__paused.clear()
+
+    def stop(self):
+        self.__stopped.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
+
+    def run(self):
+        last = time.perf_counter()
+        while not self.__stopped.is_set():
+            now = time.perf_counter()
+            if not self.__paused.is_set():
+                self.simulation.advance(now - last)
+            last = now
+
+            # Sleep until the next step is due (a bounded wait so stop() stays responsive)
+            self.__stopped.wait(min(self.simulation.time_to_next_step(), 0.05))
@@ -3,14 +3,18 @@ from pygame.locals import MOUSEBUTTONDOWN, MOUSEBUTTONUP, KEYDOWN, MOUSEMOTION,
 import glm
 from glm import vec2, vec3
 import math
+import os
 
-from constants import BACKGROUND_COLOR
+from constants import BACKGROUND_COLOR, RECORD_PATH
 # from objects import CelestialObject, VelocityArrow
 # from objects import VelocityArrow
 from transient_entity import IndicatorArrow
 from celestial_entity import PlanetEntity
 from inputs import Inputs, Button
-from scene import CelestialScene
+from scene import CelestialScene, ReplayScene
+from logger import get_logger
+
+log = get_logger(__name__)
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
@@ -36,6 +40,12 @@ class State:
     def update(self, delta_time):
         self.scene.update(delta_time)
 
+    def exit(self):
+        """
+        Called by the App when switching away from this state
+        """
+        pass
+
     # @property
     # def scene_bg(self):
     #     return self.scene.background
@@ -57,11 +67,13 @@ class MenuState(State):
 class DrawState(State):
     """
     Draw State Class
+    - Going to the replay parks the scene in app.data["draw_scene"], coming back picks it up
+      again so the run carries on where it was left
     """
     def __init__(self, app, **kwargs):
         super().__init__(app, **kwargs)
         
-        self.scene = CelestialScene(app)
+        self.scene = app.data.pop("draw_scene", None) or CelestialScene(app)
         
         self.__static_input_funcs = []
         self.__dynamic_input_funcs = {}
@@ -72,6 +84,19 @@ class DrawState(State):
 
         self.paused = False
 
+    @property
+    def paused(self):
+        return self.scene.paused
+
+    @paused.setter
+    def paused(self, p):
+        self.scene.paused = p
+
+    def exit(self):
+        # A parked scene is kept alive for the next DrawState
+        if self.app.data.get("draw_scene") is not self.scene:
+            self.scene.close()
+
     def __build_inputs(self):
         """
         Private function to bind inputs to functions
@@ -93,6 +118,17 @@ class DrawState(State):
         inputs.register("camera_test", Button(KEYDOWN, pygame.K_INSERT))
         inputs.register("camera_test2", Button(KEYDOWN, pygame.K_DELETE))    
 
+        inputs.register("cycle_engine", Button(KEYDOWN, pygame.K_g))
+        inputs.register("cycle_integrator", Button(KEYDOWN, pygame.K_i))
+        inputs.register("toggle_collisions", Button(KEYDOWN, pygame.K_c))
+        inputs.register("save_checkpoint", Button(KEYDOWN, pygame.K_F5))
+        inputs.register("restore_checkpoint", Button(KEYDOWN, pygame.K_F9))
+        inputs.register("toggle_recording", Button(KEYDOWN, pygame.K_r))
+        inputs.register("replay", Button(KEYDOWN, pygame.K_F10))
+        inputs.register("toggle_lod", Button(KEYDOWN, pygame.K_l))
+        inputs.register("toggle_vel_arrows", Button(KEYDOWN, pygame.K_v))
+        inputs.register("toggle_acc_arrows", Button(KEYDOWN, pygame.K_a))
+
         self.app.inputs = inputs
 
         # Store functions to maintain weakrefs
@@ -116,6 +152,34 @@ class DrawState(State):
         self.__static_input_funcs.append(self.app.inputs.inputs["camera_test"].on_press(self.scene.camera_front))
         self.__static_input_funcs.append(self.app.inputs.inputs["camera_test2"].on_press(self.scene.camera_normal))
 
+        self.__static_input_funcs.append(self.app.inputs.inputs["cycle_engine"].on_press(self.scene.cycle_gravity_engine))
+        self.__static_input_funcs.append(self.app.inputs.inputs["cycle_integrator"].on_press(self.scene.cycle_integrator))
+        self.__static_input_funcs.append(self.app.inputs.inputs["toggle_collisions"].on_press(self.scene.toggle_collisions))
+        self.__static_input_funcs.append(self.app.inputs.inputs["save_checkpoint"].on_press(self.scene.save_checkpoint))
+        self.__static_input_funcs.append(self.app.inputs.inputs["restore_checkpoint"].on_press(self.scene.restore_checkpoint))
+        self.__static_input_funcs.append(self.app.inputs.inputs["toggle_recording"].on_press(self.scene.toggle_recording))
+        self.__static_input_funcs.append(self.app.inputs.inputs["replay"].on_press(self.__replay))
+        self.__static_input_funcs.append(self.app.inputs.inputs["toggle_lod"].on_press(self.scene.toggle_lod))
+        self.__static_input_funcs.append(self.app.inputs.inputs["toggle_vel_arrows"].on_press(self.scene.toggle_velocity_arrows))
+        self.__static_input_funcs.append(self.app.inputs.inputs["toggle_acc_arrows"].on_press(self.scene.toggle_acceleration_arrows))
+
+    def __replay(self):
+        """
+        Private function to switch to the replay of the current (or last) recording
+        """
+        path = self.scene.recorder.path if self.scene.recorder else self.app.data.get("replay_path", RECORD_PATH)
+        if not os.path.exists(path):
+            log.warning("No recording at %s", path)
+            return
+        self.app.data["replay_path"] = path
+
+        # Finish the recording so the replay reads a complete file, and park the paused scene
+        if self.scene.recorder:
+            self.scene.toggle_recording()
+        self.paused = True
+        self.app.data["draw_scene"] = self.scene
+        self.app.state = 'replay'
+
     def __reset_new_object_stage(self):
         self.__dynamic_input_funcs["temp"] = self.app.inputs.inputs["new_object"].on_press(self.__new_object_stage1)
         self.__dynamic_input_funcs["temp2"] = None
@@ -208,8 +272,68 @@ class DrawState(State):
 
         # Blit currently drawing celestial
         if self.curr_celestial:
-            self.app.screen.blit(self.curr_celestial.image, (self.curr_celestial.rect.x, self.curr_celestial.rect.y))
+            self.app.dirty.add(self.app.screen.blit(self.curr_celestial.image, (self.curr_celestial.rect.x, self.curr_celestial.rect.y)))
 
         if self.curr_velo_arrow:
-            self.curr_velo_arrow.draw(self.app.screen)
+            self.app.dirty.add(self.curr_velo_arrow.draw(self.app.screen))
+
+
+class ReplayState(State):
+    """
+    Replay State Class
+    - Plays back the recording named by app.data["replay_path"] (RECORD_PATH by default)
+    """
+    def __init__(self, app, **kwargs):
+        super().__init__(app, **kwargs)
+
+        self.scene = ReplayScene(app, self.app.data.get("replay_path", RECORD_PATH))
 
+        self.__static_input_funcs = []
+        self.__build_inputs()
+
+    def exit(self):
+        self.scene.close()
+
+    def __build_inputs(self):
+        """
+        Private function to bind inputs to functions
+        """
+        inputs = Inputs()
+
+        inputs.register("play_pause", Button(KEYDOWN, K_SPACE))
+        inputs.register("step_back", Button(KEYDOWN, K_LEFT))
+        inputs.register("step_forward", Button(KEYDOWN, K_RIGHT))
+        inputs.register("faster", Button(KEYDOWN, K_UP))
+        inputs.register("slower", Button(KEYDOWN, K_DOWN))
+        inputs.register("seek_start", Button(KEYDOWN, pygame.K_HOME))
+        inputs.register("seek_end", Button(KEYDOWN, pygame.K_END))
+        inputs.register("scrub", Button(MOUSEBUTTONDOWN, 1))
+        inputs.register("draw", Button(KEYDOWN, pygame.K_ESCAPE))
+        inputs.register("toggle_lod", Button(KEYDOWN, pygame.K_l))
+        for k in range(10):
+            inputs.register(f"seek_{k}", Button(KEYDOWN, pygame.K_0 + k))
+
+        self.app.inputs = inputs
+
+        self.__static_input_funcs.append(self.app.inputs.inputs["play_pause"].on_press(self.scene.toggle_play))
+        self.__static_input_funcs.append(self.app.inputs.inputs["step_back"].on_press_repeat(self.scene.step_back, 0))
+        self.__static_input_funcs.append(self.app.inputs.inputs["step_forward"].on_press_repeat(self.scene.step_forward, 0))
+        self.__static_input_funcs.append(self.app.inputs.inputs["faster"].on_press(self.scene.faster))
+        self.__static_input_funcs.append(self.app.inputs.inputs["slower"].on_press(self.scene.slower))
+        self.__static_input_funcs.append(self.app.inputs.inputs["seek_start"].on_press(self.scene.seek_start))
+        self.__static_input_funcs.append(self.app.inputs.inputs["seek_end"].on_press(self.scene.seek_end))
+        self.__static_input_funcs.append(self.app.inputs.inputs["scrub"].on_press_repeat(self.scene.scrub, 0))
+        self.__static_input_funcs.append(self.app.inputs.inputs["draw"].on_press(self.__draw))
+        self.__static_input_funcs.append(self.app.inputs.inputs["toggle_lod"].on_press(self.scene.toggle_lod))
+        # Number keys jump to tenths of the recording
+        for k in range(10):
+            self.__static_input_funcs.append(self.app.inputs.inputs[f"seek_{k}"].on_press(lambda k=k: self.scene.seek_fraction(k/10)))
+
+    def __draw(self):
+        """
+        Private function to go back to drawing
+        """
+        self.app.state = 'draw'
+
+    def draw(self):
+        self.scene.draw(self.app.screen)
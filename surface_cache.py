@@ -0,0 +1,100 @@
+"""
+Cache of pre-rendered body images
+- Bodies of the same on-screen size and colour share one Surface instead of each
+  rendering its own
+"""
+import math
+from collections import OrderedDict
+import pygame
+
+from constants import SURFACE_CACHE_SIZE, SURFACE_CACHE_BYTES, ZOOM_BUCKETS_PER_OCTAVE
+
+def zoom_bucket(zoom) -> int:
+    """
+    Zoom factors are rounded to ZOOM_BUCKETS_PER_OCTAVE steps per doubling
+    """
+    return round(math.log2(zoom)*ZOOM_BUCKETS_PER_OCTAVE) if zoom > 0 else 0
+
+def bucket_zoom(bucket) -> float:
+    """
+    Zoom factor a bucket is rendered at
+    """
+    return 2**(bucket/ZOOM_BUCKETS_PER_OCTAVE)
+
+class SurfaceCache():
+    """
+    Bounded LRU cache of filled circle images, keyed by (radius, colour, zoom bucket)
+    - Returned surfaces are shared, they must not be drawn on
+    - Once 'capacity' images or 'max_bytes' of pixels are cached, the least recently used are
+      dropped to make room for each new one
+    - An image bigger than the whole budget (a huge body zoomed in) is rendered but not kept
+    """
+    def __init__(self, capacity = SURFACE_CACHE_SIZE, max_bytes = SURFACE_CACHE_BYTES):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.__surfaces = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.__surfaces)
+
+    def circle(self, radius, color, zoom = 1.0) -> pygame.Surface:
+        """
+        Image of a circle of 'radius' world units at a zoom factor (rounded to its bucket)
+        - The image is 2*r+2 pixels square with the circle centred on (r, r), r being the
+          scaled radius in whole pixels
+        """
+        bucket = zoom_bucket(zoom)
+        key = (int(radius), tuple(color), bucket)
+
+        surf = self.__surfaces.get(key)
+        if surf is not None:
+            self.hits += 1
+            self.__surfaces.move_to_end(key)
+            return surf
+
+        self.misses += 1
+        r = max(int(radius*bucket_zoom(bucket)), 0)
+        size = 2*r+2
+        surf = pygame.Surface([size]*2, pygame.SRCALPHA)
+        pygame.draw.circle(surf, color, [r]*2, r)
+        surf = surf.convert_alpha()
+
+        nbytes = self.__size(surf)
+        if nbytes > self.max_bytes:
+            return surf
+        self.__surfaces[key] = surf
+        self.bytes += nbytes
+        while len(self.__surfaces) > self.capacity or self.bytes > self.max_bytes:
+            _, old = self.__surfaces.popitem(last=False)
+            self.bytes -= self.__size(old)
+            self.evictions += 1
+        return surf
+
+    @staticmethod
+    def __size(surf) -> int:
+        return surf.get_width()*surf.get_height()*4
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size" : len(self.__surfaces),
+            "capacity" : self.capacity,
+            "bytes" : self.bytes,
+            "max_bytes" : self.max_bytes,
+            "hits" : self.hits,
+            "misses" : self.misses,
+            "evictions" : self.evictions,
+            "hit_rate" : self.hits/lookups if lookups else 0.0
+        }
+
+    def clear(self):
+        self.__surfaces.clear()
+        self.bytes = 0
+
+# Shared by all celestial entities
+body_surfaces = SurfaceCache()
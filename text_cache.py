@@ -0,0 +1,68 @@
+"""
+Cache of rendered text
+- Strings drawn every frame (labels, the FPS counter) are rendered by the font once and
+  then reused, also when a readout flips back to a value it showed before
+"""
+from collections import OrderedDict
+import pygame
+
+from constants import TEXT_CACHE_SIZE
+
+class TextCache():
+    """
+    Bounded LRU cache of rendered strings, keyed by (font, text, antialias, colour)
+    - Returned surfaces are shared, they must not be drawn on
+    - Once 'capacity' surfaces are cached, the least recently used is dropped for each new one
+    """
+    def __init__(self, capacity = TEXT_CACHE_SIZE):
+        self.capacity = capacity
+        self.__surfaces = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.__surfaces)
+
+    def render(self, font : pygame.font.Font, text, antialias, color) -> pygame.Surface:
+        """
+        font.render(text, antialias, color), rendered once per string
+        """
+        key = (font, text, antialias, tuple(color))
+        surf = self.__get(key)
+        if surf is None:
+            surf = self.__put(key, font.render(text, antialias, color))
+        return surf
+
+    def __get(self, key):
+        surf = self.__surfaces.get(key)
+        if surf is not None:
+            self.hits += 1
+            self.__surfaces.move_to_end(key)
+        return surf
+
+    def __put(self, key, surf):
+        self.misses += 1
+        self.__surfaces[key] = surf
+        if len(self.__surfaces) > self.capacity:
+            self.__surfaces.popitem(last=False)
+            self.evictions += 1
+        return surf
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size" : len(self.__surfaces),
+            "capacity" : self.capacity,
+            "hits" : self.hits,
+            "misses" : self.misses,
+            "evictions" : self.evictions,
+            "hit_rate" : self.hits/lookups if lookups else 0.0
+        }
+
+    def clear(self):
+        self.__surfaces.clear()
+
+# Shared by all labels and the FPS counter
+text_surfaces = TextCache()
@@ -0,0 +1,103 @@
+import numpy as np
+
+from constants import BLOCK_TIMESTEP_MAX_LEVEL, BLOCK_TIMESTEP_ETA
+
+class BlockTimesteps():
+    """
+    Hierarchical (block) timesteps for a Simulation
+    - Each body steps by dt/2**level, level 0..max_level, so all steps nest inside the base step
+    - Bodies are integrated with kick-drift-kick leapfrog: all bodies drift every sub-step, but
+      only the bodies whose own step ends get their forces recomputed
+    - A body's level comes from eta*|a|/|jerk| (jerk estimated from its last two force
+      evaluations), the first estimate uses sqrt(2*eta*radius/|a|)
+    - Levels can get finer at any of the body's step boundaries, coarser by one level only
+      where the coarser step would line up
+    """
+    def __init__(self, max_level = BLOCK_TIMESTEP_MAX_LEVEL, eta = BLOCK_TIMESTEP_ETA):
+        self.max_level = max_level
+        self.eta = eta
+
+        self.levels = np.zeros(0, dtype=np.int64)
+        self.__version = -1
+
+        # Body force evaluations, in total and during the last base step
+        self.evaluations = 0
+        self.last_evaluations = 0
+
+    def step(self, simulation, dt):
+        """
+        Advance every body in the simulation by one base step dt
+        """
+        b = simulation.bodies
+        n = len(b)
+        if n == 0:
+            return
+
+        pos = b.pos
+        vel = b.vel
+        acc = b.acc
+        K = self.max_level
+        evaluations = 0
+
+        # New or removed bodies: start again from fresh forces
+        if self.__version != b.version or len(self.levels) != n:
+            acc[:] = simulation.accelerations(pos)
+            evaluations += n
+            self.levels = self.__initial_levels(acc, b.radius, dt)
+            self.__version = b.version
+
+        levels = self.levels
+        sub_dt = dt/(1 << K)
+        s = 0
+        while s < (1 << K):
+            span = 1 << (K - levels)  # each body's step in sub-steps
+            half = 0.5*sub_dt*span
+
+            # Opening kick for bodies starting a step
+            starting = s % span == 0
+            vel[starting] += acc[starting]*half[starting, None]
+
+            # Everyone drifts to the next boundary of the finest level in use
+            stride = 1 << (K - levels.max())
+            pos += vel*(stride*sub_dt)
+            s += stride
+
+            # Closing kick for bodies whose step ends here, with their new forces
+            ending = np.flatnonzero(s % span == 0)
+            old_acc = acc[ending]
+            new_acc = simulation.accelerations(pos, targets=ending)
+            evaluations += len(ending)
+            acc[ending] = new_acc
+            vel[ending] += new_acc*half[ending, None]
+
+            levels[ending] = self.__next_levels(levels[ending], old_acc, new_acc, 2*half[ending], dt, s)
+
+        self.evaluations += evaluations
+        self.last_evaluations = evaluations
+
+    def __to_level(self, dt, dt_wanted):
+        """
+        Smallest level whose step dt/2**level is no longer than dt_wanted
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            level = np.ceil(np.log2(dt/dt_wanted))
+        level = np.nan_to_num(level, nan=0, posinf=self.max_level, neginf=0)
+        return np.clip(level, 0, self.max_level).astype(np.int64)
+
+    def __initial_levels(self, acc, radius, dt):
+        a = np.linalg.norm(acc, axis=1)
+        with np.errstate(divide='ignore'):
+            dt_wanted = np.sqrt(2*self.eta*np.maximum(radius, 1e-12)/a)
+        return self.__to_level(dt, dt_wanted)
+
+    def __next_levels(self, levels, old_acc, new_acc, body_dt, dt, s):
+        a = np.linalg.norm(new_acc, axis=1)
+        jerk = np.linalg.norm(new_acc - old_acc, axis=1)/body_dt
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dt_wanted = self.eta*a/jerk
+        wanted = self.__to_level(dt, dt_wanted)
+
+        # Coarsen by at most one level and only if the longer step starts on its own boundary
+        coarser = np.maximum(wanted, levels - 1)
+        aligned = s % (1 << (self.max_level - coarser)) == 0
+        return np.where(wanted >= levels, wanted, np.where(aligned, coarser, levels))
@@ -1,10 +1,9 @@
 import pygame
-from constants import ARROW_COLOR_VEL, ARROW_TO_VEL_RATIO, ARROW_TO_ACC_RATIO, ARROW_MAX_LENGTH, TYPE_ACCEL, TYPE_VEL
+from constants import ARROW_COLOR_VEL, ARROW_COLOR_ACC, ARROW_TO_VEL_RATIO, ARROW_TO_ACC_RATIO, ARROW_MAX_LENGTH, ARROW_MIN_ZOOM, TYPE_ACCEL, TYPE_VEL
 import glm
 from glm import vec2, vec3, vec4, mat4
 import math
-
-from celestial_entity import CelestialEntity
+import numpy as np
 
 class TransientEntity():
     """
@@ -18,15 +17,16 @@ class TransientEntity():
         pass
 
     def draw(self, surface : pygame.Surface):
+        """
+        Returns the Rect drawn to (None if nothing was drawn)
+        """
         pass
 
 class IndicatorArrow(TransientEntity):
 
-    def __init__(self, start, parent : CelestialEntity = None, **kwargs):
+    def __init__(self, start, **kwargs):
         super().__init__()
 
-        self.parent : CelestialObject = parent
-        
         if isinstance(start, tuple):
             self.start = vec3(start[0], start[1], 0)
         elif isinstance(start, vec3):
@@ -73,41 +73,22 @@ class IndicatorArrow(TransientEntity):
         angle = math.atan2(self.start.y - self.end.y, self.end.x - self.start.x)
         return angle
 
-    def __recalculate_for_celestial(self):
-        if self.parent:
-            if isinstance(self.parent, CelestialEntity):
-                origin = self.parent.position
-                self.start = vec3(origin.x, origin.y, 0)
-
-                endx = 0
-                endy = 0
-                if self.indcator_type == TYPE_VEL:
-                    endx = origin.x+self.parent.velocity.x/ARROW_TO_VEL_RATIO
-                    endy = origin.y+self.parent.velocity.y/ARROW_TO_VEL_RATIO
-                elif self.indcator_type == TYPE_ACCEL:
-                    endx = origin.x+self.parent.acceleration.x/ARROW_TO_ACC_RATIO
-                    endy = origin.y+self.parent.acceleration.y/ARROW_TO_ACC_RATIO
-
-                self.end = vec3(endx, endy, 0)
-
     def update(self, dt):
         super().update(dt)
-        
-        # self.__update_angle() # TODO: This recalculation might not be necessary here
-        
-        self.__recalculate_for_celestial()
 
+        # Body arrows are drawn by ArrowLayer, this only moves a free standing arrow with the world
         self.start += self.world_offset
         self.end += self.world_offset
 
     def draw(self, surface : pygame.Surface):
         super().draw(surface)
         # Draw the arrow line
-        pygame.draw.line(surface, self.color, (self.start.x, self.start.y), (self.end.x, self.end.y), self.thickness)    
+        line = pygame.draw.line(surface, self.color, (self.start.x, self.start.y), (self.end.x, self.end.y), self.thickness)    
 
         # Draw the arrow head
         arrow_points = self.__generate_arrowhead_method1(3)
-        pygame.draw.polygon(surface, self.color, arrow_points, 0)
+        head = pygame.draw.polygon(surface, self.color, arrow_points, 0)
+        return line.union(head)
 
     def __arrow_head(self):
         arrow_head = [
@@ -140,4 +121,98 @@ class IndicatorArrow(TransientEntity):
             p = p+pygame.Vector2(self.end.x, self.end.y)
             arrow_points.append(p)
 
-        return arrow_points
\ No newline at end of file
+        return arrow_points
+
+class ArrowLayer():
+    """
+    Velocity and acceleration indicator arrows of many bodies, in bulk
+    - Same arrows as an IndicatorArrow per body (shaft from the body's position, head at the
+      end), but the geometry of all of them is computed in one vectorised pass from the
+      snapshot arrays and then drawn in one tight loop
+    - Arrow types can be hidden (toggle()), and all arrows are hidden below min_zoom
+    """
+    # Arrow head outline (as IndicatorArrow.__arrow_head()) scaled to pixels, pointing along +y
+    HEAD = np.array([(0, 2), (-1, -2), (1, -2)], dtype=np.float64)*3
+
+    # Draw order, acceleration under velocity
+    TYPES = (TYPE_ACCEL, TYPE_VEL)
+
+    def __init__(self, colors = None, thickness = 1, min_zoom = ARROW_MIN_ZOOM):
+        self.colors = {TYPE_ACCEL: ARROW_COLOR_ACC, TYPE_VEL: ARROW_COLOR_VEL}
+        self.colors.update(colors or {})
+        self.thickness = thickness
+        self.min_zoom = min_zoom
+        self.shown = {t: True for t in self.TYPES}
+
+        # Per type (start x, start y, end x, end y) arrays, from update()
+        self.__start = (np.zeros(0), np.zeros(0))
+        self.__ends = {}
+
+    def toggle(self, indicator_type):
+        self.shown[indicator_type] = not self.shown[indicator_type]
+
+    def visible(self, zoom = 1.0) -> bool:
+        """
+        Whether any arrows are drawn at a zoom factor
+        """
+        return zoom >= self.min_zoom and any(self.shown.values())
+
+    def update(self, start, vel, acc):
+        """
+        Compute the arrows of every body, from (N, 2) arrays of the bodies' screen positions and
+        their velocities and accelerations in screen space (see Camera.transform()/directions())
+        """
+        sx = start[:, 0]
+        sy = start[:, 1]
+        self.__start = (sx, sy)
+        self.__ends = {
+            TYPE_VEL : (sx + vel[:, 0]/ARROW_TO_VEL_RATIO, sy + vel[:, 1]/ARROW_TO_VEL_RATIO),
+            TYPE_ACCEL : (sx + acc[:, 0]/ARROW_TO_ACC_RATIO, sy + acc[:, 1]/ARROW_TO_ACC_RATIO)
+        }
+
+    def bounds(self, margin = 0):
+        """
+        (left, top, right, bottom) arrays of the box around each body's shown arrows, widened
+        by 'margin' for the heads
+        """
+        sx, sy = self.__start
+        left, top, right, bottom = sx, sy, sx, sy
+        for t in self.TYPES:
+            if self.shown[t] and t in self.__ends:
+                ex, ey = self.__ends[t]
+                left, top = np.minimum(left, ex), np.minimum(top, ey)
+                right, bottom = np.maximum(right, ex), np.maximum(bottom, ey)
+        return left - margin, top - margin, right + margin, bottom + margin
+
+    def heads(self, sx, sy, ex, ey):
+        """
+        (N, 3, 2) array of the head corners of arrows from (sx, sy) to (ex, ey)
+        - Rotates HEAD by 270 degrees minus the shaft angle, as IndicatorArrow does
+        """
+        rads = math.radians(270) - np.arctan2(sy - ey, ex - sx)
+        c = np.cos(rads)[:, None]
+        s = np.sin(rads)[:, None]
+        hx, hy = self.HEAD[:, 0], self.HEAD[:, 1]
+        return np.stack((ex[:, None] + hx*c - hy*s, ey[:, None] + hx*s + hy*c), axis=2)
+
+    def draw(self, surface : pygame.Surface, rows = None) -> list:
+        """
+        Draw the shown arrows of the bodies in 'rows' (all when None), returns the Rects drawn to
+        """
+        line = pygame.draw.line
+        polygon = pygame.draw.polygon
+        thickness = self.thickness
+        rects = []
+        for t in self.TYPES:
+            if not self.shown[t] or t not in self.__ends:
+                continue
+            sx, sy = self.__start
+            ex, ey = self.__ends[t]
+            if rows is not None:
+                sx, sy, ex, ey = sx[rows], sy[rows], ex[rows], ey[rows]
+            heads = self.heads(sx, sy, ex, ey)
+            color = self.colors[t]
+            for x0, y0, x1, y1, head in zip(sx.tolist(), sy.tolist(), ex.tolist(), ey.tolist(), heads.tolist()):
+                r = line(surface, color, (x0, y0), (x1, y1), thickness)
+                rects.append(r.union(polygon(surface, color, head)))
+        return rects
@@ -1,10 +1,34 @@
 import pygame as pg
 
+from logger import get_logger
+from text_cache import text_surfaces
+from constants import GUI_GRID_CELL
+
+log = get_logger(__name__)
+
 class UserControlGroup:
-    def __init__(self):
+    """
+    Group of user controls
+    - Controls are looked up by name in a dict, and hit-tested through a grid of GUI_GRID_CELL
+      pixel cells holding the controls that overlap each cell
+    - The grid is rebuilt lazily after a control is added, removed or moved (see moved())
+    - Focus changes only touch (and re-render) the controls losing and gaining focus
+    """
+    def __init__(self, cell = GUI_GRID_CELL):
         self._members = pg.sprite.Group()
         self._bounds = pg.Rect(0,0,0,0)
 
+        self._names = {}
+        # Insertion order of the members, the first added wins when controls overlap
+        self._order = {}
+        self._next_order = 0
+
+        self._cell = cell
+        self._grid = None
+
+        self._focus = None
+        self._pressed = None
+
     def process_events(self, events):
         for e in events:
             if e.type == pg.MOUSEBUTTONDOWN:
@@ -21,60 +45,90 @@ class UserControlGroup:
             m.update(*args)
 
     def draw(self, surface):
-        for m in self._members:
-            surface.blit(m.image, (m.rect.x, m.rect.y))
+        """
+        Blit every control, returns the areas drawn to
+        """
+        return surface.blits([(m.image, (m.rect.x, m.rect.y)) for m in self._members])
 
     def get_input(self, name):
+        m = self._names.get(name)
+        if m is None:
+            log.warning("No input named '%s' exists", name)
+        return m
+
+    def moved(self, ip):
+        """
+        Called by a control after its rect changed, so the hit-test grid is rebuilt
+        """
+        self._grid = None
+
+    def hit(self, pos):
+        """
+        The control under a screen position (the first added when several overlap), or None
+        """
+        if self._grid is None:
+            self.__build_grid()
+        found = None
+        for m in self._grid.get((pos[0]//self._cell, pos[1]//self._cell), ()):
+            if m.rect.collidepoint(pos) and (found is None or self._order[m] < self._order[found]):
+                found = m
+        return found
+
+    def __build_grid(self):
+        """
+        Private function to put every member in the grid cells its rect overlaps
+        """
+        cell = self._cell
+        grid = {}
         for m in self._members:
-            if m.name == name:
-                return m
-
-        print(f"No input named '{name}' exists")
-        return None
+            r = m.rect
+            if r.width <= 0 or r.height <= 0:
+                continue
+            for cx in range(r.left//cell, (r.right - 1)//cell + 1):
+                for cy in range(r.top//cell, (r.bottom - 1)//cell + 1):
+                    grid.setdefault((cx, cy), []).append(m)
+        self._grid = grid
 
     def mouse_down(self, mouse_pos):
-        any_hit = 0
-        for m in self._members:
-            hit = m.rect.collidepoint(mouse_pos)
-            if hit:
-                m.on_mousedown()
-                self.set_focus_on(m)
-                any_hit = 1
-                break
-
-        if not any_hit:
-            for m in self._members:
-                m.reset()
-                self.set_focus_on(None)
+        m = self.hit(mouse_pos)
+        if m is not None:
+            m.on_mousedown()
+            self._pressed = m
+            self.set_focus_on(m)
+        else:
+            if self._pressed is not None:
+                self._pressed.reset()
+                self._pressed = None
+            self.set_focus_on(None)
 
     def mouse_up(self, mouse_pos):
-        any_hit = 0
-        for m in self._members:
-            hit = m.rect.collidepoint(mouse_pos)
-            if hit:
-                m.on_mouseup()
-                any_hit = 1
-                break
-
-        if not any_hit:
-            for m in self._members:
-                m.reset()
+        m = self.hit(mouse_pos)
+        if m is not None:
+            m.on_mouseup()
+        elif self._pressed is not None:
+            self._pressed.reset()
+        self._pressed = None
 
     def key_down(self, key_event):
-        for m in self._members:
-            if m.has_focus:
-                m.on_keydown(key_event)
-                break
+        if self._focus is not None and self._focus.has_focus:
+            self._focus.on_keydown(key_event)
 
     def key_up(self, key_event):
         pass
 
     def set_focus_on(self, ip):
-        for m in self._members:
-            if m is ip:
-                m.has_focus = True
-            else:
-                m.has_focus = False
+        """
+        Give a control the focus (None for none), only the old and new focused controls change
+        """
+        old = self._focus
+        # Buttons drop their own focus when clicked, so the current one may not have it anymore
+        if old is ip and (ip is None or ip.has_focus):
+            return
+        if old is not None and old is not ip:
+            old.has_focus = False
+        if ip is not None:
+            ip.has_focus = True
+        self._focus = ip
 
     #def remove_focus_except(self, ip):
     #    for m in self._members:
@@ -82,7 +136,12 @@ class UserControlGroup:
     #            m.has_focus = False
 
     def clear(self):
-        self._members = []
+        self._members.empty()
+        self._names.clear()
+        self._order.clear()
+        self._grid = None
+        self._focus = None
+        self._pressed = None
 
     def __bool__(self):
         return bool(self._members)
@@ -95,19 +154,32 @@ class UserControlGroup:
         return self
 
     def __isub__(self, ip):
-        for i, m in enumerate(self._members):
-            if m is ip:
-                del self._members[i]
-                return self
+        self.remove(ip)
         return self
 
     def add(self, ip):
         assert ip is not None
-        for m in self._members:
-            if ip.name == m.name:
-                raise ValueError(f"Already have an input named: {ip.name}")
+        if ip.name in self._names:
+            raise ValueError(f"Already have an input named: {ip.name}")
 
         self._members.add(ip)
+        self._names[ip.name] = ip
+        self._order[ip] = self._next_order
+        self._next_order += 1
+        self._grid = None
+        return self
+
+    def remove(self, ip):
+        if self._names.get(ip.name) is not ip:
+            return self
+        self._members.remove(ip)
+        del self._names[ip.name]
+        del self._order[ip]
+        self._grid = None
+        if self._focus is ip:
+            self._focus = None
+        if self._pressed is ip:
+            self._pressed = None
         return self
 
     def __iter__(self):
@@ -192,6 +264,7 @@ class UserControl(pg.sprite.Sprite):
         self.image = image
         self.rect = self.image.get_rect()
         self._dirty = True
+        self.parent_group.moved(self)
 
     def update(self, *args):
         self._render_internal()
@@ -219,8 +292,8 @@ class UserControl(pg.sprite.Sprite):
 
     def _render_text(self, surf, width, height, foreground, background, highlight, padding, font, text, border_thick):
         tcol = highlight if self._has_focus else foreground
-        tsurf = self._font.render(self._text, True, tcol)
-        tsize = self._font.size(self._text)
+        tsurf = text_surfaces.render(self._font, self._text, True, tcol)
+        tsize = tsurf.get_size()
         tpos = [0,0]
         tadj = [0,0] if tsize[0] <= self._width-self._padding*2 else [self._width-self._padding*2-tsize[0], 0]
 
@@ -261,6 +334,7 @@ class UserControl(pg.sprite.Sprite):
     @x.setter
     def x(self, x):
         self.rect.x = x
+        self.parent_group.moved(self)
 
     @property
     def y(self):
@@ -269,6 +343,7 @@ class UserControl(pg.sprite.Sprite):
     @y.setter
     def y(self, y):
         self.rect.y = y
+        self.parent_group.moved(self)
 
     @property
     def width(self):
@@ -280,6 +355,7 @@ class UserControl(pg.sprite.Sprite):
         ow = self.rect.width
         self.rect.width = wid
         self.rect.x += ow-wid
+        self.parent_group.moved(self)
 
     @property
     def height(self):
@@ -291,6 +367,7 @@ class UserControl(pg.sprite.Sprite):
         oh = self.rect.height
         self.rect.height = hgt
         self.rect.y += oh-hgt
+        self.parent_group.moved(self)
 
     @property
     def text(self):
@@ -298,6 +375,9 @@ class UserControl(pg.sprite.Sprite):
 
     @text.setter
     def text(self, txt):
+        # Setting the same text again (eg. every frame) does not re-render the control
+        if txt == self._text:
+            return
         self._text = txt
         self._dirty = True
 
@@ -383,6 +463,7 @@ class ToggleButton(UserControl):
         self.image = image
         self.rect = self.image.get_rect()
         self._dirty = True
+        self.parent_group.moved(self)
 
     @property
     def image2(self):
@@ -485,13 +566,13 @@ class ChoiceBox(UserControl):
                     try:
                         self._items.append(str(i))
                     except:
-                        print("Could not add item: {i}")
+                        log.warning("Could not add item: %s", i)
             self._dirty = True
         elif isinstance(items, str):
             self._items.append(str)
             self._dirty = True
         else:
-            print("Unsupported item added to choicebox")
+            log.warning("Unsupported item added to choicebox")
 
     def on_keydown(self, key_event):
         super().on_keydown(key_event)